@@ -1,46 +1,242 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Depends, Request, Query, Body
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 import time
+import asyncio
 import logging
-from app.models import TransactionRequest, TransactionResponse, HealthResponse
+import redis.asyncio as redis
+from typing import List, Optional, Annotated
+from app.models import (
+    TransactionRequest, TransactionResponse, HealthResponse,
+    BatchTransactionResult, BatchTransactionResponse, BulkStatusRequest, BulkStatusResult
+)
+from app.config import settings
 from app.services.transaction_service import TransactionService
+from app.services.status_cache import TERMINAL_STATUSES
+from app.services.worker_registry import WorkerRegistry
+from app.utils.monitoring import metrics
+from app.utils.timing import timed_handler
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-def get_transaction_service() -> TransactionService:
-    return TransactionService()
+def get_redis(request: Request) -> redis.Redis:
+    return request.app.state.redis
+
+def get_transaction_service(request: Request, redis_client: redis.Redis = Depends(get_redis)) -> TransactionService:
+    return TransactionService(redis_client, cache=request.app.state.status_cache)
+
+def admit(request: Request, count: int = 1):
+    """Shed submissions before touching Redis once the backlog is over its limits"""
+    admission = request.app.state.admission
+    if admission is None:
+        return
+    priority = admission.is_priority(request.headers.get("X-Client-Id"))
+    rejection = admission.check(count, priority=priority)
+    if rejection:
+        metrics.inc("transactions_rejected_total", count, status=str(rejection.status_code))
+        raise HTTPException(
+            status_code=rejection.status_code,
+            detail=rejection.detail,
+            headers={"Retry-After": str(rejection.retry_after)}
+        )
 
 @router.post("/api/transactions", response_model=TransactionResponse)
+@timed_handler("submit")
 async def submit_transaction(
     transaction: TransactionRequest,
+    request: Request,
     service: TransactionService = Depends(get_transaction_service)
 ):
     """Submit a transaction for processing"""
     start_time = time.time()
+    admit(request)
     
     try:
         response = await service.submit_transaction(transaction)
+        if response is None:
+            # Duplicate whose status record is gone (evicted, or left unreadable)
+            raise HTTPException(status_code=409, detail="Transaction already submitted; its status is unavailable")
         
         # Ensure sub-100ms response time
         elapsed_ms = (time.time() - start_time) * 1000
-        if elapsed_ms > 100:
-            logger.warning(f"Response time exceeded 100ms: {elapsed_ms:.2f}ms")
+        if elapsed_ms > settings.response_timeout_ms:
+            logger.warning(f"Response time exceeded {settings.response_timeout_ms}ms: {elapsed_ms:.2f}ms")
         
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error submitting transaction: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/api/transactions/batch", response_model=BatchTransactionResponse)
+@timed_handler("submit")
+async def submit_transaction_batch(
+    # Sized before the items are validated, so oversized batches fail fast
+    transactions: Annotated[List[TransactionRequest], Body(min_length=1, max_length=settings.batch_max_size)],
+    request: Request,
+    service: TransactionService = Depends(get_transaction_service)
+):
+    """Submit a batch of transactions in one request"""
+    admit(request, len(transactions))
+
+    try:
+        submitted = await service.submit_transactions(transactions)
+    except Exception as e:
+        logger.error(f"Error submitting transaction batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    results = []
+    for transaction, (response, duplicate) in zip(transactions, submitted):
+        if response:
+            results.append(BatchTransactionResult(**response.model_dump(), duplicate=duplicate))
+        else:
+            # Only a duplicate whose existing record could not be read back has no response
+            results.append(BatchTransactionResult(
+                transactionId=transaction.id, duplicate=duplicate, error="Transaction status unavailable"
+            ))
+    duplicates = sum(1 for result in results if result.duplicate)
+    return BatchTransactionResponse(
+        accepted=len(results) - duplicates,
+        duplicates=duplicates,
+        results=results
+    )
+
+@router.post("/api/transactions/status")
+async def get_transaction_statuses(
+    lookup: BulkStatusRequest,
+    service: TransactionService = Depends(get_transaction_service)
+):
+    """Look up many transaction statuses; streams one JSON object per id (NDJSON)"""
+    if len(lookup.ids) > settings.status_lookup_max_ids:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lookup exceeds the maximum of {settings.status_lookup_max_ids} ids"
+        )
+
+    try:
+        responses = await service.get_transaction_statuses(lookup.ids)
+    except Exception as e:
+        logger.error(f"Error getting transaction statuses: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    def stream_results():
+        chunk = []
+        for transaction_id, response in zip(lookup.ids, responses):
+            if response:
+                result = BulkStatusResult(found=True, **response.model_dump())
+            else:
+                result = BulkStatusResult(transactionId=transaction_id, found=False)
+            chunk.append(result.model_dump_json())
+            if len(chunk) == 100:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def _parse_wait(wait: Optional[str]) -> float:
+    """Parse a long-poll wait such as 30 or 30s, capped at WATCH_MAX_WAIT_S"""
+    if not wait:
+        return 0.0
+    try:
+        seconds = float(wait[:-1] if wait.endswith("s") else wait)
+    except ValueError:
+        seconds = -1
+    if seconds < 0:
+        raise HTTPException(status_code=422, detail="wait must be a number of seconds, e.g. 30 or 30s")
+    return min(seconds, settings.watch_max_wait_s)
+
+def _status_event(response: Optional[TransactionResponse], transaction_id: str) -> str:
+    if response:
+        result = BulkStatusResult(found=True, **response.model_dump())
+    else:
+        result = BulkStatusResult(transactionId=transaction_id, found=False)
+    return f"event: status\ndata: {result.model_dump_json()}\n\n"
+
+@router.get("/api/transactions/watch")
+async def watch_transactions(
+    request: Request,
+    ids: str = Query(..., description="Comma-separated transaction ids"),
+    service: TransactionService = Depends(get_transaction_service)
+):
+    """Stream status changes for one or many transactions as Server-Sent Events"""
+    transaction_ids = list(dict.fromkeys(tid.strip() for tid in ids.split(",") if tid.strip()))
+    if not transaction_ids:
+        raise HTTPException(status_code=422, detail="ids must list at least one transaction id")
+    if len(transaction_ids) > settings.watch_max_ids:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Watch exceeds the maximum of {settings.watch_max_ids} ids"
+        )
+    watcher = request.app.state.status_watcher
+
+    async def stream_events():
+        # Register before the first read so no transition can slip between them.
+        # Reads skip the status cache: a stale entry would swallow the change
+        # just announced, and a final status is announced only once
+        with watcher.watch(transaction_ids) as changes:
+            last_status = {}
+            responses = await service.get_transaction_statuses(transaction_ids, cached=False)
+            for transaction_id, response in zip(transaction_ids, responses):
+                last_status[transaction_id] = response.status if response else None
+                yield _status_event(response, transaction_id)
+            watching = {tid for tid, status in last_status.items() if status and status not in TERMINAL_STATUSES}
+
+            while watching:
+                try:
+                    transaction_id = await asyncio.wait_for(changes.get(), timeout=settings.watch_keepalive_s)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if transaction_id not in watching:
+                    continue
+
+                response = await service.get_transaction_status(transaction_id, cached=False)
+                status = response.status if response else None
+                if status != last_status[transaction_id]:
+                    last_status[transaction_id] = status
+                    yield _status_event(response, transaction_id)
+                if status is None or status in TERMINAL_STATUSES:
+                    watching.discard(transaction_id)
+
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/api/transactions/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction_status(
     transaction_id: str,
+    request: Request,
+    wait: Optional[str] = Query(None, description="Long-poll: hold up to this long (e.g. 30s) for a status change"),
     service: TransactionService = Depends(get_transaction_service)
 ):
-    """Get transaction status"""
+    """Get transaction status, optionally waiting for it to change"""
     try:
-        response = await service.get_transaction_status(transaction_id)
+        wait_seconds = _parse_wait(wait)
+        if wait_seconds:
+            with request.app.state.status_watcher.watch([transaction_id]) as changes:
+                response = await service.get_transaction_status(transaction_id, cached=False)
+                if response and response.status not in TERMINAL_STATUSES:
+                    # A wake-up is only a hint (the watcher also wakes everyone
+                    # after reconnecting): hold on until the status really moves
+                    initial = response.status
+                    deadline = time.monotonic() + wait_seconds
+                    while response and response.status == initial:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            await asyncio.wait_for(changes.get(), timeout=remaining)
+                        except asyncio.TimeoutError:
+                            break
+                        response = await service.get_transaction_status(transaction_id, cached=False)
+        else:
+            response = await service.get_transaction_status(transaction_id)
         if not response:
             raise HTTPException(status_code=404, detail="Transaction not found")
         return response
@@ -53,18 +249,28 @@ async def get_transaction_status(
 
 @router.get("/api/health", response_model=HealthResponse)
 async def health_check(
+    request: Request,
+    redis_client: redis.Redis = Depends(get_redis),
     service: TransactionService = Depends(get_transaction_service)
 ):
     """System health check"""
     try:
-        queue_depth = service.get_queue_depth()
+        queue_depth = await service.get_queue_depth()
+        # Workers may run in other processes or hosts; they all heartbeat into Redis
+        workers = await WorkerRegistry(redis_client, settings.worker_heartbeat_interval_s).statuses()
+        publisher = request.app.state.metrics_publisher
+        cluster_metrics = await publisher.collect() if publisher else metrics
         
         return HealthResponse(
             status="healthy",
             queue_depth=queue_depth,
-            error_rate=0.0,  # TODO: Implement error rate calculation
-            uptime=time.time(),  # TODO: Track actual uptime
-            worker_status={"active_workers": 10}  # TODO: Track actual worker status
+            error_rate=cluster_metrics.error_rate(),
+            uptime=metrics.uptime(),
+            worker_status={
+                "active_workers": sum(status["active_workers"] for status in workers.values()),
+                "processes": len(workers),
+                "workers": workers
+            }
         )
         
     except Exception as e:
@@ -72,4 +278,21 @@ async def health_check(
         return JSONResponse(
             status_code=503,
             content={"status": "unhealthy", "error": str(e)}
-        )
\ No newline at end of file
+        )
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics(
+    request: Request,
+    service: TransactionService = Depends(get_transaction_service)
+):
+    """Prometheus metrics summed over every API and worker process sharing this Redis"""
+    publisher = request.app.state.metrics_publisher
+    if not publisher:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+
+    collected = await publisher.collect()
+    gauges = {
+        "transaction_queue_depth": await service.get_queue_depth(),
+        "transaction_retry_depth": await service.queue.retry_depth()
+    }
+    return PlainTextResponse(collected.render(gauges), media_type="text/plain; version=0.0.4")
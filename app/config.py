@@ -1,25 +1,134 @@
 from pydantic_settings import BaseSettings
+from typing import List
 import os
 
 class Settings(BaseSettings):
+    # API server (run.py)
+    server_profile: str = "dev"  # "dev" reloads on change; "prod" runs one process per core
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 0  # prod processes; 0 = one per core
+    server_backlog: int = 2048
+    server_keepalive_s: int = 5
+    server_access_log: bool = False  # per-request access logging costs throughput in prod
+
     # Redis Configuration
     redis_url: str = "redis://localhost:6379/0"  # default for local
     redis_db: int = 0
+    # Shared asyncio pool. When every connection is busy, commands wait up to
+    # redis_pool_timeout for one to free up before failing
+    redis_max_connections: int = 100
+    redis_pool_timeout: float = 5.0
+    redis_socket_timeout: float = 5.0
+    redis_health_check_interval: int = 30
 
     # Posting Service Configuration
     posting_service_url: str = "http://localhost:8080"
+    posting_timeout: float = 30.0
+    posting_max_connections: int = 100
+    posting_max_keepalive_connections: int = 50
+    posting_keepalive_expiry: float = 30.0
+    posting_http2: bool = False  # requires the optional h2 package
+    # Cluster-wide request/s budgets shared by every worker process; 0 disables
+    posting_post_rate_limit: float = 0
+    posting_post_burst: int = 0  # 0 = one second's worth
+    posting_get_rate_limit: float = 0
+    posting_get_burst: int = 0
+    rate_limit_lease_size: int = 10  # tokens taken from Redis per round trip
+    rate_limit_lease_ttl_ms: int = 1000  # unspent leased tokens are dropped after this
 
     # Worker Configuration
-    worker_concurrency: int = 10
+    embedded_worker: bool = True  # run a worker (and webhook dispatcher) inside each API process
+    worker_processes: int = 1  # default process count for `python -m app.worker`
+    worker_shutdown_grace_s: float = 30.0  # time in-flight transactions get to finish on shutdown
+    worker_heartbeat_interval_s: float = 5.0
+    worker_concurrency: int = 10  # initial posting concurrency; adapts within the bounds below
+    worker_min_concurrency: int = 1
+    worker_max_concurrency: int = 100
+    # Back off when posting latency exceeds this multiple of its no-load latency
+    limiter_latency_tolerance: float = 2.0
+    limiter_backoff_ratio: float = 0.9
+    worker_batch_size: int = 50  # max entries leased and loaded per Redis round trip
     max_retries: int = 5
     retry_delay: int = 2
+    retry_poll_interval_ms: int = 500  # how often due retries are moved back onto the queue
+    # After a POST with an unknown outcome (timeout, 5xx), wait at least this long
+    # before asking the posting service whether it landed
+    posting_verify_delay_ms: int = 1000
+
+    # Circuit breaker: stop dequeuing while the posting service is hard-down
+    breaker_failure_threshold: int = 5  # consecutive failed calls
+    breaker_open_s: float = 5.0  # doubled per failed probe, up to breaker_max_open_s
+    breaker_max_open_s: float = 60.0
+
+    # Queue Configuration (Redis Streams consumer group)
+    queue_consumer_group: str = "transaction_workers"
+    queue_visibility_timeout_ms: int = 120000  # idle lease age before another worker may claim it
+    queue_reclaim_interval_ms: int = 5000
+    queue_max_deliveries: int = 10
+
+    # Completion webhooks
+    webhooks_enabled: bool = True
+    webhook_consumer_group: str = "webhook_dispatchers"
+    webhook_timeout: float = 10.0
+    webhook_max_connections: int = 100
+    webhook_max_concurrency_per_host: int = 4
+    webhook_batch_max_size: int = 50  # max completions per coalesced POST, for callbacks with callback_batch
+    webhook_max_attempts: int = 8
+    webhook_retry_delay: float = 1.0  # doubled per failed attempt
+    # Callback URLs may only use these hosts (and their subdomains); empty allows any public host
+    webhook_allowed_hosts: List[str] = []
+    webhook_allow_private_networks: bool = False  # allow loopback/private/link-local callbacks, e.g. in development
+
+    # How long status records, payloads and dedup keys live. Redis memory is
+    # roughly submissions/s x status_ttl_s x ~1 KB; see README "Redis Memory"
+    status_ttl_s: int = 86400
+
+    # Payloads at least this large (bytes of JSON) are stored zlib-compressed; 0 disables
+    payload_compression_threshold: int = 1024
+    record_codec: str = "json"  # payload format to write: json, or fast once every process can read it
 
     # Performance Configuration
+    batch_max_size: int = 1000  # max items per POST /api/transactions/batch
+    status_lookup_max_ids: int = 1000  # max ids per POST /api/transactions/status
     response_timeout_ms: int = 100
-    queue_max_size: int = 10000
+    queue_max_size: int = 10000  # backlog (queued + awaiting retry) at which submissions are shed
+
+    # Admission control: 503/429 with Retry-After instead of growing the backlog
+    admission_enabled: bool = True
+    admission_refresh_ms: int = 250  # how often each API process re-reads the backlog depth
+    admission_max_drain_s: float = 600  # also shed when the backlog would take longer to drain; 0 disables
+    admission_reserved_share: float = 0.1  # share of queue_max_size only priority clients may use
+    admission_priority_clients: List[str] = []  # X-Client-Id values
+    admission_retry_after_s: int = 5  # Retry-After while the drain rate is unknown
+    admission_max_retry_after_s: int = 60
+
+    # In-process status cache (API), invalidated by status events
+    status_cache_enabled: bool = True
+    status_cache_max_entries: int = 100000
+    status_cache_pending_ttl_ms: int = 500  # upper bound on staleness if an event is missed
+
+    # Status watch (long-poll / SSE)
+    watch_max_wait_s: float = 60.0
+    watch_max_ids: int = 100
+    watch_keepalive_s: float = 15.0
 
     # Monitoring
     metrics_enabled: bool = True
+    metrics_publish_interval_s: float = 5.0  # how often each process shares its metrics for /metrics
+    stage_timing_enabled: bool = True  # per-stage histograms for the submit and worker pipelines
+    server_timing_enabled: bool = False  # list each request's stages in a Server-Timing response header
+
+    # Logging
+    log_level: str = "INFO"
+    log_format: str = "text"  # text or json
+    log_async: bool = True  # write logs from a background thread instead of the event loop
+    log_sample_rate: float = 1.0  # share of transactions whose INFO lines are kept; warnings and errors always are
+
+    # Event-loop monitoring
+    loop_monitor_enabled: bool = True
+    loop_lag_interval_ms: int = 100  # how often loop lag is sampled
+    loop_block_threshold_ms: int = 0  # log the stack of anything blocking the loop this long; 0 disables
 
     class Config:
         env_file = ".env"
@@ -6,13 +6,20 @@ from contextlib import asynccontextmanager
 
 from app.api.routes import router
 from app.services.worker import TransactionWorker
+from app.services.webhooks import WebhookDispatcher
+from app.services.redis_pool import create_redis_client, close_redis_client
+from app.services.redis_scripts import load_scripts
+from app.services.status_cache import StatusCache
+from app.services.status_events import StatusEventListener, StatusWatcher
+from app.services.admission import AdmissionController
+from app.utils.monitoring import metrics, MetricsPublisher, MetricsMiddleware
+from app.utils.timing import StageTimingMiddleware
+from app.utils.loop_monitor import LoopMonitor
+from app.utils.logging_config import configure_logging
 from app.config import settings
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configure_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -26,22 +33,77 @@ async def lifespan(app: FastAPI):
     
     # Startup
     logger.info("Starting Transaction Processing Service")
-    worker = TransactionWorker()
+    app.state.redis = create_redis_client()
+    await load_scripts(app.state.redis)
+
+    # Status events keep API-side state in step with worker transitions
+    app.state.status_events = StatusEventListener(app.state.redis)
+    app.state.status_cache = None
+    if settings.status_cache_enabled:
+        app.state.status_cache = StatusCache(
+            max_entries=settings.status_cache_max_entries,
+            pending_ttl=settings.status_cache_pending_ttl_ms / 1000
+        )
+        app.state.status_events.add_handler(lambda transaction_id, _: app.state.status_cache.invalidate(transaction_id))
+        app.state.status_events.add_reconnect_handler(app.state.status_cache.invalidate_pending)
+    # Watchers run after cache invalidation so their re-reads see fresh state
+    app.state.status_watcher = StatusWatcher()
+    app.state.status_events.add_handler(app.state.status_watcher.notify)
+    app.state.status_events.add_reconnect_handler(app.state.status_watcher.notify_all)
+    status_events_task = asyncio.create_task(app.state.status_events.run())
+
+    # Each process shares its metrics through Redis so any process can serve /metrics
+    app.state.metrics_publisher = None
+    metrics_task = None
+    if settings.metrics_enabled:
+        app.state.metrics_publisher = MetricsPublisher(app.state.redis, metrics, settings.metrics_publish_interval_s)
+        metrics_task = asyncio.create_task(app.state.metrics_publisher.run())
+
+    # Loop lag, and with a block threshold set, the stack of whatever stalls the loop
+    loop_monitor_task = None
+    if settings.loop_monitor_enabled:
+        loop_monitor = LoopMonitor(settings.loop_lag_interval_ms / 1000, settings.loop_block_threshold_ms / 1000)
+        loop_monitor_task = asyncio.create_task(loop_monitor.run())
+
+    # Backlog depth for admission control, refreshed off the request path
+    app.state.admission = AdmissionController(app.state.redis) if settings.admission_enabled else None
+    admission_task = None
+    if app.state.admission:
+        await app.state.admission.refresh()
+        admission_task = asyncio.create_task(app.state.admission.run())
+
+    # With EMBEDDED_WORKER=false workers run on their own (python -m app.worker)
+    worker = TransactionWorker(app.state.redis) if settings.embedded_worker else None
+    app.state.worker = worker
     
     # Start worker in background
-    worker_task = asyncio.create_task(worker.start())
+    worker_task = asyncio.create_task(worker.start()) if worker else None
+
+    # Webhooks are delivered off the posting path, with their own connection pool
+    webhooks = WebhookDispatcher(app.state.redis) if worker and settings.webhooks_enabled else None
+    webhooks_task = asyncio.create_task(webhooks.start()) if webhooks else None
     
     yield
     
-    # Shutdown
+    # Shutdown - stop leasing, then give in-flight work the grace period
     logger.info("Shutting down Transaction Processing Service")
-    if worker:
-        worker.stop()
-        worker_task.cancel()
+    background = [(service, task) for service, task in ((worker, worker_task), (webhooks, webhooks_task)) if service]
+    for service, _ in background:
+        service.stop()
+    for service, task in background:
         try:
-            await worker_task
-        except asyncio.CancelledError:
+            await asyncio.wait_for(task, settings.worker_shutdown_grace_s + 5)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
             pass
+        await service.aclose()
+    status_events_task.cancel()
+    if admission_task:
+        admission_task.cancel()
+    if metrics_task:
+        metrics_task.cancel()
+    if loop_monitor_task:
+        loop_monitor_task.cancel()
+    await close_redis_client(app.state.redis)
 
 # Create FastAPI app
 app = FastAPI(
@@ -51,6 +113,11 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+if settings.stage_timing_enabled:
+    app.add_middleware(StageTimingMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
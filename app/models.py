@@ -1,8 +1,9 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, HttpUrl, field_validator
+from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone
 from enum import Enum
 import uuid
+from app.utils.callback_urls import callback_url_problem
 
 class TransactionStatus(str, Enum):
     PENDING = "pending"
@@ -23,6 +24,22 @@ class TransactionRequest(BaseModel):
     description: str = Field(..., min_length=1, max_length=255)
     timestamp: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
     metadata: Optional[Dict[str, Any]] = None
+    # Receives the final TransactionResponse; not forwarded to the posting service
+    callback_url: Optional[HttpUrl] = None
+    # Opt in to receiving completions for the same callback_url coalesced into one POST
+    callback_batch: bool = False
+
+    @field_validator("callback_url")
+    @classmethod
+    def callback_url_is_allowed(cls, url: Optional[HttpUrl]) -> Optional[HttpUrl]:
+        if url is not None:
+            problem = callback_url_problem(str(url))
+            if problem:
+                raise ValueError(problem)
+        return url
+
+# TransactionRequest fields that are ours, not the posting service's
+CLIENT_ONLY_FIELDS = {"callback_url", "callback_batch"}
 
 class TransactionResponse(BaseModel):
     transactionId: str
@@ -31,6 +48,31 @@ class TransactionResponse(BaseModel):
     completedAt: Optional[datetime] = None
     error: Optional[str] = None
 
+class BatchTransactionResult(BaseModel):
+    """One per submitted item, in order; status is None when it could not be read back"""
+    transactionId: str
+    status: Optional[TransactionStatus] = None
+    submittedAt: Optional[datetime] = None
+    completedAt: Optional[datetime] = None
+    error: Optional[str] = None
+    duplicate: bool = False
+
+class BatchTransactionResponse(BaseModel):
+    accepted: int
+    duplicates: int
+    results: List[BatchTransactionResult]
+
+class BulkStatusRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1)
+
+class BulkStatusResult(BaseModel):
+    transactionId: str
+    found: bool
+    status: Optional[TransactionStatus] = None
+    submittedAt: Optional[datetime] = None
+    completedAt: Optional[datetime] = None
+    error: Optional[str] = None
+
 class HealthResponse(BaseModel):
     status: str
     queue_depth: int
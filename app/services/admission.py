@@ -0,0 +1,95 @@
+import time
+import math
+import asyncio
+import logging
+import redis.asyncio as redis
+from typing import NamedTuple, Optional
+from app.config import settings
+from app.services.transaction_queue import TransactionQueue
+from app.services.worker_registry import WorkerRegistry
+
+logger = logging.getLogger(__name__)
+
+class Rejection(NamedTuple):
+    status_code: int
+    detail: str
+    retry_after: int
+
+class AdmissionController:
+    """
+    Sheds submissions once the backlog (queued + awaiting retry) is too deep
+    or would take too long to drain, so a posting outage cannot grow Redis
+    without bound.
+
+    Depth is refreshed in the background rather than read per request; what
+    this process admitted since the last refresh is added on top so a burst
+    between refreshes cannot overshoot by much. The drain rate is the sum of
+    the live workers' reported throughput. Priority clients may use a
+    reserved share of queue_max_size that other clients cannot.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis_client = redis_client
+        self.queue = TransactionQueue(redis_client)
+        self.registry = WorkerRegistry(redis_client, settings.worker_heartbeat_interval_s)
+        self.max_depth = settings.queue_max_size
+        self.normal_max_depth = int(self.max_depth * (1 - settings.admission_reserved_share))
+        self.priority_clients = set(settings.admission_priority_clients)
+        self.depth = 0
+        self.drain_rate: Optional[float] = None  # None until workers have reported throughput
+        self._admitted = 0
+        self._drain_refreshed_at = 0.0
+
+    async def run(self):
+        interval = settings.admission_refresh_ms / 1000
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep deciding on the last known depth
+                logger.error(f"Admission depth refresh failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    async def refresh(self):
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.xlen(self.queue.stream_key)
+            pipe.zcard(self.queue.retry_key)
+            queued, retrying = await pipe.execute()
+        self.depth = queued + retrying
+        self._admitted = 0
+
+        now = time.monotonic()
+        if now - self._drain_refreshed_at >= self.registry.interval:
+            self._drain_refreshed_at = now
+            workers = await self.registry.statuses()
+            rate = sum(status.get("throughput_per_s", 0) for status in workers.values())
+            self.drain_rate = rate if rate > 0 else None
+
+    def is_priority(self, client_id: Optional[str]) -> bool:
+        return client_id is not None and client_id in self.priority_clients
+
+    def check(self, count: int = 1, priority: bool = False) -> Optional[Rejection]:
+        """Admit count submissions, or say why not"""
+        depth = self.depth + self._admitted + count
+        limit = self.max_depth if priority else self.normal_max_depth
+
+        if depth > limit:
+            if depth <= self.max_depth:
+                return Rejection(429, "Capacity is reserved for priority clients", self._retry_after(depth - limit))
+            return Rejection(503, "Transaction queue is full", self._retry_after(depth - limit))
+
+        max_drain = settings.admission_max_drain_s
+        if max_drain and self.drain_rate and depth / self.drain_rate > max_drain:
+            excess = depth - self.drain_rate * max_drain
+            return Rejection(503, "Transaction backlog is too slow to drain", self._retry_after(excess))
+
+        self._admitted += count
+        return None
+
+    def _retry_after(self, excess: float) -> int:
+        """Seconds until the excess should have drained, when the drain rate is known"""
+        if not self.drain_rate:
+            return settings.admission_retry_after_s
+        return min(max(1, math.ceil(excess / self.drain_rate)), settings.admission_max_retry_after_s)
@@ -0,0 +1,143 @@
+import time
+import logging
+from enum import Enum
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for calls to a downstream service.
+
+    Each completed call reports its latency and whether it failed. While
+    latency stays within `tolerance` times the no-load latency the limit
+    grows by about one per limit's worth of calls; a failure, or latency
+    beyond that, cuts it by `backoff_ratio`. The no-load latency is the
+    minimum observed, drifting slowly upward so a permanently slower
+    downstream eventually becomes the new baseline.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int,
+                 tolerance: float = 2.0, backoff_ratio: float = 0.9, baseline_drift: float = 0.001):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff_ratio = backoff_ratio
+        self.baseline_drift = baseline_drift
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self.no_load_latency = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def record(self, latency: float, failed: bool = False, in_flight: int = 0):
+        """
+        Adjust the limit for one completed call. in_flight is the number of
+        calls outstanding when it started; the limit only grows when it was
+        actually being used, so an idle period cannot inflate it.
+        """
+        if failed:
+            self._decrease()
+            return
+
+        if self.no_load_latency is None:
+            self.no_load_latency = latency
+        else:
+            self.no_load_latency = min(latency, self.no_load_latency * (1 + self.baseline_drift))
+
+        if latency > self.no_load_latency * self.tolerance:
+            self._decrease()
+        elif in_flight >= self._limit / 2:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def _decrease(self):
+        self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+
+    def state(self) -> dict:
+        return {
+            "limit": self.limit,
+            "no_load_latency_ms": round(self.no_load_latency * 1000, 2) if self.no_load_latency is not None else None
+        }
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and stays open for
+    `open_seconds`, doubling on each failed probe up to `max_open_seconds`.
+    Once the open period has passed, a single probe call is let through
+    (half-open): success closes the circuit, failure reopens it. A probe
+    that never reports back frees its slot after `probe_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int, open_seconds: float, max_open_seconds: float,
+                 probe_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._open_for = open_seconds
+        self._opened_at = 0.0
+        self._probe_started = None
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self.clock() - self._opened_at >= self._open_for:
+            self._state = CircuitState.HALF_OPEN
+            self._probe_started = None
+            logger.info("Circuit half-open, probing posting service")
+        return self._state
+
+    def available(self, free: int) -> int:
+        """How many of `free` slots may start calls now"""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return free
+        if state == CircuitState.HALF_OPEN and free > 0:
+            if self._probe_started is None or self.clock() - self._probe_started >= self.probe_timeout:
+                return 1
+        return 0
+
+    def start_probe(self):
+        if self._state == CircuitState.HALF_OPEN:
+            self._probe_started = self.clock()
+
+    def retry_in(self) -> float:
+        """Seconds until the open circuit admits a probe"""
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._open_for - (self.clock() - self._opened_at))
+
+    def record_success(self):
+        if self._state != CircuitState.CLOSED:
+            logger.info("Circuit closed, posting service recovered")
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._open_for = self.open_seconds
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == CircuitState.HALF_OPEN:
+            self._open_for = min(self._open_for * 2, self.max_open_seconds)
+            self._open("probe failed")
+        elif self._state == CircuitState.CLOSED and self._failures >= self.failure_threshold:
+            self._open(f"{self._failures} consecutive failures")
+
+    def _open(self, reason: str):
+        self._state = CircuitState.OPEN
+        self._opened_at = self.clock()
+        logger.warning(f"Circuit open for {self._open_for:.1f}s after {reason}")
+
+    def state_info(self) -> dict:
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._failures,
+            "retry_in_s": round(self.retry_in(), 2)
+        }
@@ -1,102 +1,229 @@
 import httpx
 import asyncio
 import logging
-from typing import Optional, Dict, Any
-from datetime import datetime
+import redis.asyncio as redis
+from enum import Enum
+from typing import Optional, Dict, Any, NamedTuple
 from app.config import settings
-from app.models import TransactionRequest
+from app.models import TransactionRequest, CLIENT_ONLY_FIELDS
+from app.services.rate_limit import TokenBucket
+from app.services.record_codec import CODECS
 
 logger = logging.getLogger(__name__)
 
+class PostFailure(str, Enum):
+    NOT_SENT = "not_sent"  # no connection, so the posting service never saw it
+    REJECTED = "rejected"  # 4xx - seen and refused
+    TIMEOUT = "timeout"
+    CONNECTION_LOST = "connection_lost"
+    SERVER_ERROR = "server_error"
+
+# Failures after which the transaction may or may not have been posted
+AMBIGUOUS_FAILURES = (PostFailure.TIMEOUT, PostFailure.CONNECTION_LOST, PostFailure.SERVER_ERROR)
+
+class PostingJob(NamedTuple):
+    """A transaction ready to post: its JSON request body is serialized once, up front"""
+    transaction_id: str
+    body: str
+
+    @classmethod
+    def from_transaction(cls, transaction: TransactionRequest) -> "PostingJob":
+        return cls(transaction.id, CODECS["json"].encode(transaction.model_dump(exclude=CLIENT_ONLY_FIELDS)))
+
+class PostResult(NamedTuple):
+    success: bool
+    error: Optional[str] = None
+    failure: Optional[PostFailure] = None
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
 class PostingServiceClient:
-    def __init__(self):
+    """
+    Posting service client holding one long-lived, pooled HTTP connection set.
+    Given a Redis client, calls also draw from the cluster-wide POST/GET
+    rate limits.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
         self.base_url = settings.posting_service_url
-        self.timeout = httpx.Timeout(30.0)
-    
+        self.timeout = httpx.Timeout(settings.posting_timeout)
+
+        http2 = settings.posting_http2
+        if http2 and not _http2_available():
+            logger.warning("POSTING_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.posting_max_connections,
+                max_keepalive_connections=settings.posting_max_keepalive_connections,
+                keepalive_expiry=settings.posting_keepalive_expiry
+            )
+        )
+
+        self.post_bucket = self._bucket(redis_client, "posting_post",
+                                        settings.posting_post_rate_limit, settings.posting_post_burst)
+        self.get_bucket = self._bucket(redis_client, "posting_get",
+                                       settings.posting_get_rate_limit, settings.posting_get_burst)
+
+    @staticmethod
+    def _bucket(redis_client: Optional[redis.Redis], name: str, rate: float, burst: int) -> Optional[TokenBucket]:
+        if redis_client is None or rate <= 0:
+            return None
+        return TokenBucket(
+            redis_client, name, rate, burst=burst,
+            lease_size=settings.rate_limit_lease_size,
+            lease_ttl=settings.rate_limit_lease_ttl_ms / 1000
+        )
+
+    def rate_limit_state(self) -> dict:
+        return {
+            bucket.name: bucket.state()
+            for bucket in (self.post_bucket, self.get_bucket) if bucket
+        }
+
+    async def aclose(self):
+        """Close pooled connections"""
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
     async def post_transaction(self, transaction: TransactionRequest) -> tuple[bool, Optional[str]]:
         """
         Post transaction to posting service.
         Returns (success, error_message)
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            try:
-                # Use model_dump instead of deprecated dict()
-                payload = transaction.model_dump()
-                
-                # Ensure timestamp is properly formatted
-                if isinstance(payload["timestamp"], datetime):
-                    payload["timestamp"] = payload["timestamp"].isoformat()
-                
-                logger.info(f"Posting transaction {transaction.id} to {self.base_url}/transactions")
-                
-                response = await client.post(
-                    f"{self.base_url}/transactions",
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                logger.info(f"Posting service response: {response.status_code} - {response.text}")
-                
-                # Check for successful status codes (200, 201)
-                if response.status_code in [200, 201]:
-                    logger.info(f"Successfully posted transaction {transaction.id}")
-                    return True, None
-                else:
-                    error_msg = f"Posting failed with status {response.status_code}: {response.text}"
-                    logger.error(error_msg)
-                    return False, error_msg
-                    
-            except Exception as e:
-                error_msg = f"Posting service error: {str(e)}"
-                logger.error(error_msg)
-                return False, error_msg
-    
+        result = await self.post(PostingJob.from_transaction(transaction))
+        return result.success, result.error
+
+    async def wait_for_post(self):
+        """Take a token from the POST rate limit, if there is one"""
+        if self.post_bucket:
+            await self.post_bucket.acquire()
+
+    async def wait_for_get(self):
+        """Take a token from the GET rate limit, if there is one"""
+        if self.get_bucket:
+            await self.get_bucket.acquire()
+
+    async def post(self, job: PostingJob, rate_limited: bool = True) -> PostResult:
+        """
+        Post a transaction to the posting service, classifying any failure.
+        Pass rate_limited=False when the caller already called wait_for_post().
+        """
+        if rate_limited:
+            await self.wait_for_post()
+        log_extra = {"transaction_id": job.transaction_id}
+        try:
+            logger.debug("Posting transaction %s to %s/transactions", job.transaction_id, self.base_url, extra=log_extra)
+
+            response = await self.client.post(
+                "/transactions",
+                content=job.body,
+                headers={"Content-Type": "application/json"}
+            )
+
+            # Check for successful status codes (200, 201)
+            if response.status_code in [200, 201]:
+                logger.info("Successfully posted transaction %s (%d)", job.transaction_id, response.status_code, extra=log_extra)
+                return PostResult(True)
+            else:
+                error_msg = f"Posting failed with status {response.status_code}: {response.text}"
+                logger.error(error_msg, extra=log_extra)
+                failure = PostFailure.SERVER_ERROR if response.status_code >= 500 else PostFailure.REJECTED
+                return PostResult(False, error_msg, failure)
+
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # No connection was established, so the request never left
+            error_msg = f"Posting service unreachable: {str(e) or type(e).__name__}"
+            logger.error(error_msg, extra=log_extra)
+            return PostResult(False, error_msg, PostFailure.NOT_SENT)
+
+        except httpx.TimeoutException as e:
+            error_msg = f"Posting service timed out: {str(e) or type(e).__name__}"
+            logger.error(error_msg, extra=log_extra)
+            return PostResult(False, error_msg, PostFailure.TIMEOUT)
+
+        except Exception as e:
+            error_msg = f"Posting service error: {str(e)}"
+            logger.error(error_msg, extra=log_extra)
+            return PostResult(False, error_msg, PostFailure.CONNECTION_LOST)
+
+    async def transaction_exists(self, transaction_id: str, rate_limited: bool = True) -> Optional[bool]:
+        """
+        Like get_transaction, but None when the posting service could not say.
+        Pass rate_limited=False when the caller already called wait_for_get().
+        """
+        try:
+            if rate_limited:
+                await self.wait_for_get()
+            response = await self.client.get(f"/transactions/{transaction_id}")
+        except Exception as e:
+            logger.error(f"Error checking transaction {transaction_id}: {str(e)}")
+            return None
+        if response.status_code == 200:
+            return True
+        if response.status_code == 404:
+            return False
+        logger.warning(f"Unexpected status {response.status_code} when checking transaction {transaction_id}")
+        return None
+
     async def get_transaction(self, transaction_id: str) -> tuple[bool, Optional[Dict[str, Any]]]:
         """
         Check if transaction exists in posting service.
         Returns (exists, transaction_data)
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            try:
-                logger.info(f"Checking transaction {transaction_id} at {self.base_url}/transactions/{transaction_id}")
-                
-                response = await client.get(f"{self.base_url}/transactions/{transaction_id}")
-                
-                logger.info(f"Get transaction response: {response.status_code}")
-                
-                if response.status_code == 200:
-                    data = await response.json()
-                    return True, data
-                elif response.status_code == 404:
-                    return False, None
-                else:
-                    logger.warning(f"Unexpected status {response.status_code} when checking transaction {transaction_id}")
-                    return False, None
-                    
-            except Exception as e:
-                logger.error(f"Error checking transaction {transaction_id}: {str(e)}")
+        try:
+            await self.wait_for_get()
+
+            logger.info(f"Checking transaction {transaction_id} at {self.base_url}/transactions/{transaction_id}")
+
+            response = await self.client.get(f"/transactions/{transaction_id}")
+
+            logger.info(f"Get transaction response: {response.status_code}")
+
+            if response.status_code == 200:
+                return True, response.json()
+            elif response.status_code == 404:
                 return False, None
-    
+            else:
+                logger.warning(f"Unexpected status {response.status_code} when checking transaction {transaction_id}")
+                return False, None
+
+        except Exception as e:
+            logger.error(f"Error checking transaction {transaction_id}: {str(e)}")
+            return False, None
+
     async def cleanup(self) -> bool:
         """Cleanup all transactions (for testing)"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            try:
-                logger.info(f"Cleaning up posting service at {self.base_url}/cleanup")
-                response = await client.post(f"{self.base_url}/cleanup")
-                logger.info(f"Cleanup response: {response.status_code}")
-                return response.status_code == 200
-            except Exception as e:
-                logger.error(f"Cleanup failed: {str(e)}")
-                return False
-    
+        try:
+            logger.info(f"Cleaning up posting service at {self.base_url}/cleanup")
+            response = await self.client.post("/cleanup")
+            logger.info(f"Cleanup response: {response.status_code}")
+            return response.status_code == 200
+        except Exception as e:
+            logger.error(f"Cleanup failed: {str(e)}")
+            return False
+
     async def test_connection(self) -> bool:
         """Test connection to posting service"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            try:
-                # Try to get transactions list first
-                response = await client.get(f"{self.base_url}/transactions")
-                logger.info(f"Connection test response: {response.status_code}")
-                return response.status_code in [200, 404]  # 404 is OK if no transactions
-            except Exception as e:
-                logger.error(f"Connection test failed: {str(e)}")
-                return False
\ No newline at end of file
+        try:
+            # Try to get transactions list first
+            response = await self.client.get("/transactions")
+            logger.info(f"Connection test response: {response.status_code}")
+            return response.status_code in [200, 404]  # 404 is OK if no transactions
+        except Exception as e:
+            logger.error(f"Connection test failed: {str(e)}")
+            return False
@@ -0,0 +1,87 @@
+import time
+import asyncio
+import logging
+import redis.asyncio as redis
+from typing import Optional
+from app.services.redis_scripts import TAKE_TOKENS
+from app.utils.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Process-local view of a token bucket shared through Redis.
+
+    Tokens are taken from Redis in leases of up to `lease_size`, so most
+    acquires are served locally without a round trip; concurrent callers
+    that run dry share a single refill. Leased tokens not spent within
+    `lease_ttl` are dropped, so an idle process cannot save up tokens and
+    later exceed the cluster-wide rate.
+    """
+
+    key_prefix = "rate_limit:"
+
+    def __init__(self, redis_client: redis.Redis, name: str, rate: float,
+                 burst: Optional[int] = None, lease_size: int = 10, lease_ttl: float = 1.0):
+        self.redis_client = redis_client
+        self.name = name
+        self.key = f"{self.key_prefix}{name}"
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        # A lease never exceeds a tenth of a second's budget
+        self.lease_size = max(1, min(lease_size, int(rate / 10)))
+        self.lease_ttl = lease_ttl
+        self._tokens = 0
+        self._leased_at = 0.0
+        self._refill = asyncio.Lock()
+        self._sleeps = 0
+        self.throttled_seconds = 0.0
+        self.throttled_calls = 0
+
+    async def acquire(self, wanted: int = 1) -> int:
+        """Wait for a token, taking up to `wanted` if they are at hand; returns how many were taken"""
+        taken = self._take_local(wanted)
+        if taken:
+            return taken
+
+        started = time.monotonic()
+        sleeps = self._sleeps
+        async with self._refill:
+            while True:
+                taken = self._take_local(wanted)
+                if taken:
+                    break
+                granted, wait_ms = await TAKE_TOKENS(
+                    self.redis_client, keys=[self.key], args=[self.rate, self.burst, self.lease_size]
+                )
+                if granted:
+                    self._tokens = granted
+                    self._leased_at = time.monotonic()
+                else:
+                    # Sleep holding the lock so other callers queue behind us
+                    self._sleeps += 1
+                    await asyncio.sleep(wait_ms / 1000)
+
+        # Waiting on someone else's sleep counts as throttled too
+        if self._sleeps != sleeps:
+            waited = time.monotonic() - started
+            self.throttled_calls += 1
+            self.throttled_seconds += waited
+            metrics.inc("rate_limit_throttled_total", bucket=self.name)
+            metrics.inc("rate_limit_throttled_seconds_total", waited, bucket=self.name)
+        return taken
+
+    def _take_local(self, wanted: int) -> int:
+        if self._tokens and time.monotonic() - self._leased_at < self.lease_ttl:
+            taken = min(wanted, self._tokens)
+            self._tokens -= taken
+            return taken
+        self._tokens = 0
+        return 0
+
+    def state(self) -> dict:
+        return {
+            "rate": self.rate,
+            "throttled_calls": self.throttled_calls,
+            "throttled_seconds": round(self.throttled_seconds, 3)
+        }
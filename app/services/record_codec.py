@@ -0,0 +1,126 @@
+"""
+Codecs for the transaction payload stored with each status record.
+
+Encoded records start with a tag naming their format, and decode_record()
+reads every format whatever RECORD_CODEC writes, so a rolling upgrade can
+switch writers over once every reader understands the new tag:
+
+    (no tag)  JSON with ISO timestamps, as written by every earlier release;
+              this is also the posting service's request body
+    "f1:"     compact JSON (orjson when installed), epoch-microsecond timestamps
+
+Everything stays text because the Redis client decodes responses as str.
+"""
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # optional; the fast format is plain JSON either way
+    orjson = None
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+class RecordCodec(ABC):
+    """Encodes a record dict to a tagged str"""
+
+    tag = ""
+
+    @abstractmethod
+    def encode(self, record: dict) -> str:
+        ...
+
+    @abstractmethod
+    def decode_body(self, body: str) -> dict:
+        """Decode what follows the tag"""
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+class JsonCodec(RecordCodec):
+    """Stdlib JSON, untagged - the format written before codecs were versioned"""
+
+    def encode(self, record: dict) -> str:
+        return json.dumps(record, default=_json_default)
+
+    def decode_body(self, body: str) -> dict:
+        return json.loads(body)
+
+class FastCodec(RecordCodec):
+    """
+    Compact JSON with the given datetime fields as integer epoch microseconds,
+    which skips ISO formatting and parsing. Naive datetimes are listed under
+    NAIVE_KEY so they decode naive again. Records orjson cannot represent
+    exactly (integers beyond 64 bits) are written untagged by JsonCodec.
+    """
+
+    tag = "f1:"
+    NAIVE_KEY = "~naive"
+
+    def __init__(self, datetime_fields: Iterable[str]):
+        self.datetime_fields = tuple(datetime_fields)
+
+    def encode(self, record: dict) -> str:
+        original, record = record, dict(record)
+        naive = []
+        for field in self.datetime_fields:
+            value = record.get(field)
+            if isinstance(value, datetime):
+                if value.tzinfo is None:
+                    naive.append(field)
+                    value = value.replace(tzinfo=timezone.utc)
+                record[field] = (value - EPOCH) // MICROSECOND
+        if naive:
+            record[self.NAIVE_KEY] = naive
+        if orjson is not None:
+            try:
+                return self.tag + orjson.dumps(record, default=str).decode()
+            except TypeError:  # orjson.JSONEncodeError, e.g. "Integer exceeds 64-bit range"
+                return JsonCodec().encode(original)
+        return self.tag + json.dumps(record, default=str, separators=(",", ":"))
+
+    def decode_body(self, body: str) -> dict:
+        record = orjson.loads(body) if orjson is not None else json.loads(body)
+        naive = record.pop(self.NAIVE_KEY, ())
+        for field in self.datetime_fields:
+            value = record.get(field)
+            if isinstance(value, int):
+                value = EPOCH + value * MICROSECOND
+                record[field] = value.replace(tzinfo=None) if field in naive else value
+        return record
+
+# TransactionRequest datetime fields
+PAYLOAD_DATETIME_FIELDS = ("timestamp",)
+
+CODECS: Dict[str, RecordCodec] = {
+    "json": JsonCodec(),
+    "fast": FastCodec(PAYLOAD_DATETIME_FIELDS),
+}
+
+_TAGGED = [codec for codec in CODECS.values() if codec.tag]
+
+def get_codec(name: Optional[str] = None) -> RecordCodec:
+    """The codec to write with (RECORD_CODEC by default)"""
+    name = name or settings.record_codec
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown record codec {name!r}; expected one of {', '.join(CODECS)}")
+
+def decode_record(data: str) -> dict:
+    """Decode a record written by any codec"""
+    for codec in _TAGGED:
+        if data.startswith(codec.tag):
+            return codec.decode_body(data[len(codec.tag):])
+    return CODECS["json"].decode_body(data)
+
+def posting_body(data: str) -> str:
+    """The posting service request body for a stored payload, passed through untouched when it is untagged JSON"""
+    for codec in _TAGGED:
+        if data.startswith(codec.tag):
+            return CODECS["json"].encode(codec.decode_body(data[len(codec.tag):]))
+    return data
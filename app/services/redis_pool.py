@@ -0,0 +1,28 @@
+import logging
+import redis.asyncio as redis
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+def create_redis_client() -> redis.Redis:
+    """
+    Create the app-scoped asyncio Redis client backed by one shared connection
+    pool. The pool is blocking: at max_connections, commands queue for a free
+    connection (up to redis_pool_timeout) instead of failing outright.
+    """
+    pool = redis.BlockingConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+        decode_responses=True
+    )
+    logger.info(f"Created Redis connection pool (max_connections={settings.redis_max_connections})")
+    return redis.Redis(connection_pool=pool)
+
+async def close_redis_client(client: redis.Redis):
+    """Close the client and disconnect every pooled connection"""
+    await client.aclose()
+    await client.connection_pool.disconnect()
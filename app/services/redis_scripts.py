@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import redis.asyncio as redis
+from redis.exceptions import NoScriptError
+
+logger = logging.getLogger(__name__)
+
+class RedisScript:
+    """Server-side Lua script invoked by SHA"""
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def __call__(self, client: redis.Redis, keys: list = (), args: list = ()):
+        try:
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+        except NoScriptError:
+            # Script cache was flushed (restart, failover) - reload and retry once
+            logger.warning(f"Script {self.name} missing from Redis script cache, reloading")
+            await client.script_load(self.source)
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+
+    def queue(self, pipe, keys: list = (), args: list = ()):
+        """Queue an EVALSHA on a pipeline; scripts must already be loaded"""
+        pipe.evalsha(self.sha, len(keys), *keys, *args)
+
+# Pub/sub channel carrying "<status>:<transaction id>" for every status change
+STATUS_EVENTS_CHANNEL = "transaction_status_events"
+
+# Status records written before they became hashes are JSON strings that
+# also hold the payload. upgrade_legacy_status() rewrites one as a hash in
+# place, keeping its TTL, and moves its payload under the payload key; a
+# record too broken to read becomes a failed record rather than a key every
+# hash command errors on. Returns 1 when it upgraded a record, else 0.
+_UPGRADE_LEGACY_STATUS = """
+local function upgrade_legacy_status(key, payload_key)
+    if redis.call('TYPE', key).ok ~= 'string' then
+        return 0
+    end
+    local ok, record = pcall(cjson.decode, redis.call('GET', key))
+    if not ok or type(record) ~= 'table' or type(record.status) ~= 'string' then
+        record = {status = 'failed', error = 'Unreadable status record from an earlier release'}
+    end
+    local ttl = redis.call('PTTL', key)
+    redis.call('DEL', key)
+    for _, field in ipairs({'transactionId', 'status', 'submittedAt', 'completedAt', 'error', 'retryCount'}) do
+        local value = record[field]
+        if type(value) == 'string' or type(value) == 'number' then
+            redis.call('HSET', key, field, tostring(value))
+        end
+    end
+    if type(record.transaction_data) == 'table' then
+        redis.call('SET', payload_key, cjson.encode(record.transaction_data), 'NX')
+    end
+    if ttl > 0 then
+        redis.call('PEXPIRE', key, ttl)
+        redis.call('PEXPIRE', payload_key, ttl)
+    end
+    return 1
+end
+"""
+
+# KEYS: status key, payload key
+UPGRADE_LEGACY_STATUS = RedisScript("upgrade_legacy_status", _UPGRADE_LEGACY_STATUS + """
+return upgrade_legacy_status(KEYS[1], KEYS[2])
+""")
+
+# Atomically dedup, store the payload, create the status hash and enqueue.
+# An id is a duplicate while either its dedup key or its status record
+# exists, so a record is never overwritten back to pending and re-queued.
+# KEYS: dedup key, status key, payload key, queue stream key
+# ARGV: transaction id, queued at, dedup TTL, record TTL, payload, status field/value pairs...
+# Returns {"new"} or {"duplicate", <existing status hash as a flat field/value list>}
+SUBMIT_TRANSACTION = RedisScript("submit_transaction", _UPGRADE_LEGACY_STATUS + """
+upgrade_legacy_status(KEYS[2], KEYS[3])
+if redis.call('EXISTS', KEYS[2]) == 1 or not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[3]) then
+    return {'duplicate', redis.call('HGETALL', KEYS[2])}
+end
+redis.call('SET', KEYS[3], ARGV[5], 'EX', ARGV[4])
+redis.call('HSET', KEYS[2], unpack(ARGV, 6))
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('XADD', KEYS[4], '*', 'transaction_id', ARGV[1], 'queued_at', ARGV[2])
+redis.call('PUBLISH', '""" + STATUS_EVENTS_CHANNEL + """', 'pending:' .. ARGV[1])
+return {'new'}
+""")
+
+# Compare-and-set on the status field: the hash is only updated when its
+# current status is in the comma-separated allowed list. Status changes are
+# published to STATUS_EVENTS_CHANNEL, and reaching a final status queues a
+# webhook delivery when the transaction has a callback URL and webhooks are
+# enabled (webhook_key is nil otherwise). Legacy string records are
+# upgraded first. Returns 1 or 0.
+_APPLY_TRANSITION = _UPGRADE_LEGACY_STATUS + """
+local function apply_transition(key, allowed, status, first_field, webhook_key, payload_key)
+    upgrade_legacy_status(key, payload_key)
+    local current = redis.call('HMGET', key, 'status', 'transactionId', 'callbackUrl')
+    if not current[1] or not string.find(',' .. allowed .. ',', ',' .. current[1] .. ',', 1, true) then
+        return 0
+    end
+    redis.call('HSET', key, 'status', status, unpack(ARGV, first_field))
+    if current[1] ~= status then
+        redis.call('PUBLISH', '""" + STATUS_EVENTS_CHANNEL + """', status .. ':' .. current[2])
+        if webhook_key and current[3] and (status == 'completed' or status == 'failed') then
+            redis.call('XADD', webhook_key, '*', 'transaction_id', current[2])
+        end
+    end
+    return 1
+end
+"""
+
+# KEYS: status key, webhook stream key, payload key
+# ARGV: allowed current statuses, new status, webhooks enabled ("1"/"0"), field/value pairs...
+TRANSITION_STATUS = RedisScript("transition_status", _APPLY_TRANSITION + """
+local webhook_key = ARGV[3] == '1' and KEYS[2] or nil
+return apply_transition(KEYS[1], ARGV[1], ARGV[2], 4, webhook_key, KEYS[3])
+""")
+
+# Record a worker outcome and release its queue lease in one atomic step.
+# The retry is only scheduled when the transition applied.
+# KEYS: status key, retry sorted set, queue stream key, webhook stream key, payload key
+# ARGV: allowed current statuses, new status, consumer group, entry id,
+#       retry due (epoch ms, or empty), transaction id, webhooks enabled ("1"/"0"),
+#       field/value pairs...
+COMMIT_OUTCOME = RedisScript("commit_outcome", _APPLY_TRANSITION + """
+local webhook_key = ARGV[7] == '1' and KEYS[4] or nil
+local applied = apply_transition(KEYS[1], ARGV[1], ARGV[2], 8, webhook_key, KEYS[5])
+if applied == 1 and ARGV[5] ~= '' then
+    redis.call('ZADD', KEYS[2], ARGV[5], ARGV[6])
+end
+redis.call('XACK', KEYS[3], ARGV[3], ARGV[4])
+redis.call('XDEL', KEYS[3], ARGV[4])
+return applied
+""")
+
+# Move retries whose due time has passed back onto the queue stream.
+# KEYS: retry sorted set, queue stream key
+# ARGV: now (epoch ms), max to promote, queued at
+# Returns the number promoted
+PROMOTE_RETRIES = RedisScript("promote_retries", """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, transaction_id in ipairs(due) do
+    redis.call('ZREM', KEYS[1], transaction_id)
+    redis.call('XADD', KEYS[2], '*', 'transaction_id', transaction_id, 'queued_at', ARGV[3])
+end
+return #due
+""")
+
+# Move queue items left in the pre-stream LIST queue onto the stream, oldest
+# first. Items that are not the old {"transaction_id", "queued_at"} JSON are
+# set aside rather than dropped.
+# KEYS: legacy list, queue stream key, list for unreadable items
+# ARGV: max to move
+# Returns {moved, set aside}
+MIGRATE_LEGACY_QUEUE = RedisScript("migrate_legacy_queue", """
+local moved, skipped = 0, 0
+for _ = 1, tonumber(ARGV[1]) do
+    local item = redis.call('RPOP', KEYS[1])
+    if not item then
+        break
+    end
+    local ok, decoded = pcall(cjson.decode, item)
+    if ok and type(decoded) == 'table' and type(decoded.transaction_id) == 'string' then
+        local queued_at = type(decoded.queued_at) == 'string' and decoded.queued_at or ''
+        redis.call('XADD', KEYS[2], '*', 'transaction_id', decoded.transaction_id, 'queued_at', queued_at)
+        moved = moved + 1
+    else
+        redis.call('RPUSH', KEYS[3], item)
+        skipped = skipped + 1
+    end
+end
+return {moved, skipped}
+""")
+
+# Token bucket refilled continuously from the Redis server clock, so every
+# process shares one budget regardless of local clock skew.
+# KEYS: bucket hash key
+# ARGV: rate (tokens/s), burst capacity, tokens wanted
+# Returns {tokens granted, ms until the next token when none were granted}
+TAKE_TOKENS = RedisScript("take_tokens", """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local granted = math.min(tonumber(ARGV[3]), math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+local wait = 0
+if granted == 0 then
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+return {granted, wait}
+""")
+
+SCRIPTS = [UPGRADE_LEGACY_STATUS, SUBMIT_TRANSACTION, TRANSITION_STATUS, COMMIT_OUTCOME, PROMOTE_RETRIES, MIGRATE_LEGACY_QUEUE, TAKE_TOKENS]
+
+async def load_scripts(client: redis.Redis):
+    """Load every script into the Redis script cache so calls can go by SHA"""
+    for script in SCRIPTS:
+        sha = await client.script_load(script.source)
+        if sha != script.sha:
+            raise RuntimeError(f"SHA mismatch loading script {script.name}")
+    logger.info(f"Loaded {len(SCRIPTS)} Redis scripts")
@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.models import TransactionResponse, TransactionStatus
+
+TERMINAL_STATUSES = (TransactionStatus.COMPLETED, TransactionStatus.FAILED)
+
+class StatusCache:
+    """
+    Bounded LRU of parsed status responses for the API process.
+
+    Terminal responses never change, so they live until the record itself
+    expires. Pending/processing responses are held only briefly and are
+    also dropped as soon as a status event for the transaction arrives.
+    """
+
+    def __init__(self, max_entries: int, pending_ttl: float):
+        self.max_entries = max_entries
+        self.pending_ttl = pending_ttl
+        self._entries: "OrderedDict[str, tuple[float, TransactionResponse]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, transaction_id: str) -> Optional[TransactionResponse]:
+        entry = self._entries.get(transaction_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self._entries[transaction_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(transaction_id)
+        self.hits += 1
+        return response
+
+    def put(self, response: TransactionResponse, record_ttl: float):
+        """Cache a response whose record has record_ttl seconds left to live"""
+        ttl = record_ttl if response.status in TERMINAL_STATUSES else min(record_ttl, self.pending_ttl)
+        if ttl <= 0:
+            return
+        self._entries[response.transactionId] = (time.monotonic() + ttl, response)
+        self._entries.move_to_end(response.transactionId)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, transaction_id: str):
+        self._entries.pop(transaction_id, None)
+
+    def invalidate_pending(self):
+        """Drop every non-terminal entry, e.g. after missing status events"""
+        for transaction_id in [tid for tid, (_, response) in self._entries.items()
+                               if response.status not in TERMINAL_STATUSES]:
+            del self._entries[transaction_id]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import redis.asyncio as redis
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Set
+from app.models import TransactionStatus
+from app.services.redis_scripts import STATUS_EVENTS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+StatusHandler = Callable[[str, TransactionStatus], None]
+
+class StatusEventListener:
+    """
+    Subscribes to the status events published by every status transition
+    and fans them out to in-process handlers. Handlers run on the event
+    loop and must not block.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis_client = redis_client
+        self._handlers: List[StatusHandler] = []
+        self._reconnect_handlers: List[Callable[[], None]] = []
+        self.connected = False
+
+    def add_handler(self, handler: StatusHandler):
+        self._handlers.append(handler)
+
+    def add_reconnect_handler(self, handler: Callable[[], None]):
+        """Called after (re)subscribing, since events may have been missed meanwhile"""
+        self._reconnect_handlers.append(handler)
+
+    async def run(self):
+        while True:
+            try:
+                async with self.redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(STATUS_EVENTS_CHANNEL)
+                    self.connected = True
+                    for handler in self._reconnect_handlers:
+                        handler()
+                    while True:
+                        # Bounded waits keep the pool's socket timeout from tearing down an idle subscription
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message:
+                            self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Status event subscription lost: {str(e)}")
+            self.connected = False
+            await asyncio.sleep(1)
+
+    def _dispatch(self, data: str):
+        try:
+            status, transaction_id = data.split(":", 1)
+            status = TransactionStatus(status)
+        except ValueError:
+            logger.warning(f"Ignoring malformed status event: {data}")
+            return
+        for handler in self._handlers:
+            try:
+                handler(transaction_id, status)
+            except Exception as e:
+                logger.error(f"Status event handler error: {str(e)}")
+
+class StatusWatcher:
+    """Wakes long-poll and SSE requests waiting on particular transactions"""
+
+    def __init__(self):
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+
+    @contextmanager
+    def watch(self, transaction_ids: List[str]):
+        """Yield a queue receiving the id of each watched transaction whose status changes"""
+        queue = asyncio.Queue()
+        for transaction_id in transaction_ids:
+            self._watchers.setdefault(transaction_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            for transaction_id in transaction_ids:
+                watchers = self._watchers.get(transaction_id)
+                if watchers:
+                    watchers.discard(queue)
+                    if not watchers:
+                        del self._watchers[transaction_id]
+
+    def notify(self, transaction_id: str, status: TransactionStatus):
+        for queue in self._watchers.get(transaction_id, ()):
+            queue.put_nowait(transaction_id)
+
+    def notify_all(self):
+        """Wake every watcher so it re-reads, e.g. after events may have been missed"""
+        for transaction_id, watchers in self._watchers.items():
+            for queue in watchers:
+                queue.put_nowait(transaction_id)
+
+    def __len__(self) -> int:
+        return len(self._watchers)
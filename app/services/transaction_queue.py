@@ -0,0 +1,165 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import redis.asyncio as redis
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
+from redis.exceptions import ResponseError
+from app.config import settings
+from app.services.redis_scripts import PROMOTE_RETRIES, MIGRATE_LEGACY_QUEUE
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class QueueEntry:
+    entry_id: str
+    transaction_id: str
+    queued_at: Optional[str] = None
+    deliveries: int = 1
+
+class TransactionQueue:
+    """
+    Reliable work queue on a Redis Stream consumer group.
+
+    Entries stay in the group's pending list until acked, so a worker that
+    dies mid-transaction leaves its lease behind; once idle for longer than
+    the visibility timeout another consumer claims it with XAUTOCLAIM.
+    Acked entries are deleted, so XLEN is the outstanding work.
+
+    Failed attempts wait in a sorted set scored by due time and are promoted
+    back onto the stream by promote_due_retries.
+    """
+
+    stream_key = "transaction_stream"
+    retry_key = "transaction_retry"
+    # LIST queue used before the stream; drained by migrate_legacy_list
+    legacy_list_key = "transaction_queue"
+
+    def __init__(self, redis_client: redis.Redis, consumer: Optional[str] = None):
+        self.redis_client = redis_client
+        self.group = settings.queue_consumer_group
+        self.consumer = consumer
+        self.visibility_timeout_ms = settings.queue_visibility_timeout_ms
+        self.reclaim_interval = settings.queue_reclaim_interval_ms / 1000
+        self._reclaim_cursor = "0-0"
+        self._last_reclaim = 0.0
+
+    @staticmethod
+    def default_consumer_name() -> str:
+        """Unique across processes and hosts sharing the group"""
+        return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    async def ensure_group(self):
+        # Look before creating, so routine restarts don't provoke BUSYGROUP errors
+        if await self.redis_client.exists(self.stream_key):
+            groups = await self.redis_client.xinfo_groups(self.stream_key)
+            if any(group["name"] == self.group for group in groups):
+                return
+        try:
+            await self.redis_client.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+            logger.info(f"Created consumer group {self.group} on {self.stream_key}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def migrate_legacy_list(self, batch_size: int = 1000) -> int:
+        """Move anything left in the old LIST queue onto the stream; safe to run in every worker"""
+        total = 0
+        while True:
+            moved, skipped = await MIGRATE_LEGACY_QUEUE(
+                self.redis_client,
+                keys=[self.legacy_list_key, self.stream_key, f"{self.legacy_list_key}:unmigrated"],
+                args=[batch_size]
+            )
+            total += moved
+            if skipped:
+                logger.error(f"Set aside {skipped} unreadable items from {self.legacy_list_key} "
+                             f"in {self.legacy_list_key}:unmigrated")
+            if moved + skipped < batch_size:
+                break
+        if total:
+            logger.warning(f"Moved {total} transactions from the legacy {self.legacy_list_key} list onto {self.stream_key}")
+        return total
+
+    async def read(self, count: int = 1, block_ms: int = 1000) -> List[QueueEntry]:
+        """Lease up to count entries, preferring expired leases over new work"""
+        entries = await self._reclaim(count)
+        if entries:
+            return entries
+
+        response = await self.redis_client.xreadgroup(
+            self.group, self.consumer, {self.stream_key: ">"}, count=count, block=block_ms
+        )
+        if not response:
+            return []
+        return [self._to_entry(entry_id, fields) for entry_id, fields in response[0][1]]
+
+    async def _reclaim(self, count: int) -> List[QueueEntry]:
+        now = time.monotonic()
+        if now - self._last_reclaim < self.reclaim_interval:
+            return []
+        self._last_reclaim = now
+
+        next_cursor, messages, *_ = await self.redis_client.xautoclaim(
+            self.stream_key, self.group, self.consumer,
+            min_idle_time=self.visibility_timeout_ms,
+            start_id=self._reclaim_cursor,
+            count=count
+        )
+        self._reclaim_cursor = next_cursor
+        # Entries deleted while pending come back empty
+        messages = [(entry_id, fields) for entry_id, fields in messages if entry_id and fields]
+        if not messages:
+            return []
+
+        pending = await self.redis_client.xpending_range(
+            self.stream_key, self.group,
+            min=messages[0][0], max=messages[-1][0], count=len(messages),
+            consumername=self.consumer
+        )
+        deliveries = {p["message_id"]: p["times_delivered"] for p in pending}
+
+        entries = []
+        for entry_id, fields in messages:
+            entry = self._to_entry(entry_id, fields)
+            entry.deliveries = deliveries.get(entry_id, 1)
+            entries.append(entry)
+        logger.warning(f"Reclaimed {len(entries)} expired queue leases")
+        return entries
+
+    async def ack(self, *entry_ids: str):
+        if not entry_ids:
+            return
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            self.ack_in(pipe, *entry_ids)
+            await pipe.execute()
+
+    def ack_in(self, pipe, *entry_ids: str):
+        """Queue the ack on a pipeline owned by the caller"""
+        pipe.xack(self.stream_key, self.group, *entry_ids)
+        pipe.xdel(self.stream_key, *entry_ids)
+
+    async def promote_due_retries(self, limit: int = 100) -> int:
+        now = datetime.now(timezone.utc)
+        return await PROMOTE_RETRIES(
+            self.redis_client,
+            keys=[self.retry_key, self.stream_key],
+            args=[int(now.timestamp() * 1000), limit, now.isoformat()]
+        )
+
+    async def depth(self) -> int:
+        return await self.redis_client.xlen(self.stream_key)
+
+    async def retry_depth(self) -> int:
+        return await self.redis_client.zcard(self.retry_key)
+
+    @staticmethod
+    def _to_entry(entry_id: str, fields: dict) -> QueueEntry:
+        return QueueEntry(
+            entry_id=entry_id,
+            transaction_id=fields["transaction_id"],
+            queued_at=fields.get("queued_at")
+        )
@@ -1,102 +1,373 @@
-import json
-import redis
+import zlib
+import base64
+import redis.asyncio as redis
 import logging
 from datetime import datetime, timezone
-from typing import Optional
-from app.models import TransactionRequest, TransactionResponse, TransactionStatus
+from typing import Optional, List, Dict, Tuple
+from redis.exceptions import NoScriptError, ResponseError
+from app.models import TransactionRequest, TransactionResponse, TransactionStatus, CLIENT_ONLY_FIELDS
 from app.config import settings
+from app.services.redis_scripts import (
+    SUBMIT_TRANSACTION, TRANSITION_STATUS, COMMIT_OUTCOME, UPGRADE_LEGACY_STATUS, load_scripts
+)
+from app.services.transaction_queue import TransactionQueue, QueueEntry
+from app.services.status_cache import StatusCache
+from app.services.record_codec import RecordCodec, get_codec, decode_record, posting_body
+from app.utils.monitoring import metrics
+from app.utils.timing import stage
 
 logger = logging.getLogger(__name__)
 
+# Statuses a record must currently be in for a transition to apply. A
+# reclaimed lease re-enters processing, and retry bookkeeping is written
+# as a processing -> processing transition.
+ALLOWED_TRANSITIONS = {
+    TransactionStatus.PROCESSING: (TransactionStatus.PENDING, TransactionStatus.PROCESSING),
+    TransactionStatus.COMPLETED: (TransactionStatus.PROCESSING,),
+    TransactionStatus.FAILED: (TransactionStatus.PENDING, TransactionStatus.PROCESSING),
+}
+
+RESPONSE_FIELDS = ("transactionId", "status", "submittedAt", "completedAt", "error")
+
+COMPRESSED_PAYLOAD_PREFIX = "z:"
+
+def encode_payload(transaction_data: dict, codec: Optional[RecordCodec] = None) -> str:
+    """Serialize a payload, zlib-compressing it when that pays off"""
+    payload = (codec or get_codec()).encode(transaction_data)
+    threshold = settings.payload_compression_threshold
+    if threshold and len(payload) >= threshold:
+        compressed = COMPRESSED_PAYLOAD_PREFIX + base64.b64encode(zlib.compress(payload.encode())).decode()
+        if len(compressed) < len(payload):
+            return compressed
+    return payload
+
+def decode_payload(payload: str) -> dict:
+    return decode_record(_decompress(payload))
+
+def payload_posting_body(payload: str) -> str:
+    """The stored payload as a posting service request body, without validating it again"""
+    return posting_body(_decompress(payload))
+
+def _is_wrong_type(error: ResponseError) -> bool:
+    return str(error).startswith("WRONGTYPE")
+
+def _decompress(payload: str) -> str:
+    if payload.startswith(COMPRESSED_PAYLOAD_PREFIX):
+        return zlib.decompress(base64.b64decode(payload[len(COMPRESSED_PAYLOAD_PREFIX):])).decode()
+    return payload
+
 class TransactionService:
-    def __init__(self):
-        self.redis_client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
-        self.queue_key = "transaction_queue"
+    """
+    Status records are Redis hashes, so state transitions only write the
+    fields that change, guarded by a compare-and-set on the status field.
+    The transaction payload is stored once under its own key so status
+    reads and transitions never move it. Records still stored as JSON
+    strings by earlier releases are upgraded to hashes the first time a
+    script or status read touches them.
+
+    Status reads go through the optional in-process cache, which the API
+    keeps fresh from status events.
+
+    Payloads are written with the RECORD_CODEC codec and read in any format.
+    """
+
+    def __init__(self, redis_client: redis.Redis, cache: Optional[StatusCache] = None,
+                 codec: Optional[RecordCodec] = None):
+        self.redis_client = redis_client
+        self.cache = cache
+        self.codec = codec or get_codec()
+        self.queue = TransactionQueue(redis_client)
         self.status_key_prefix = "transaction_status:"
+        self.payload_key_prefix = "transaction_payload:"
         self.dedup_key_prefix = "transaction_dedup:"
+        self.status_ttl = settings.status_ttl_s
+        # Ids stay deduplicated for as long as their status record exists
+        self.dedup_ttl = self.status_ttl
+        # Final transitions of records with a callbackUrl are queued here for delivery
+        self.webhook_stream_key = "webhook_stream"
 
-    async def submit_transaction(self, transaction: TransactionRequest) -> TransactionResponse:
-        transaction_id = transaction.id
-        dedup_key = f"{self.dedup_key_prefix}{transaction_id}"
-
-        if self.redis_client.exists(dedup_key):
-            logger.info(f"Duplicate transaction detected: {transaction_id}")
-            return await self.get_transaction_status(transaction_id)
+    async def submit_transaction(self, transaction: TransactionRequest) -> Optional[TransactionResponse]:
+        """The new record's response, the existing one's for a duplicate; None for a duplicate whose record is unreadable"""
+        now = datetime.now(timezone.utc)
 
-        self.redis_client.setex(dedup_key, 3600, "1")  # 1 hour TTL
+        # Dedup check, status record and enqueue in one atomic round trip
+        with stage("encode", "submit"):
+            keys, args = self._submit_script_call(transaction, now)
+        with stage("redis", "submit"):
+            result = await SUBMIT_TRANSACTION(self.redis_client, keys=keys, args=args)
+        response, _ = self._submit_result(transaction.id, now, result)
+        return response
 
+    async def submit_transactions(self, transactions: List[TransactionRequest]) -> List[Tuple[TransactionResponse, bool]]:
+        """
+        Submit a batch in one pipelined round trip; each item is still deduped
+        and enqueued atomically. Returns (response, duplicate) per item.
+        """
         now = datetime.now(timezone.utc)
-        status_record = {
+        with stage("encode", "submit"):
+            calls = [self._submit_script_call(transaction, now) for transaction in transactions]
+        for attempt in range(2):
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for keys, args in calls:
+                    SUBMIT_TRANSACTION.queue(pipe, keys=keys, args=args)
+                try:
+                    with stage("redis", "submit"):
+                        results = await pipe.execute()
+                    break
+                except NoScriptError:
+                    # Every call in the pipeline failed the same way; reload and resend
+                    if attempt:
+                        raise
+                    await load_scripts(self.redis_client)
+
+        logger.info("Submitted batch of %d transactions", len(transactions))
+        return [
+            self._submit_result(transaction.id, now, result)
+            for transaction, result in zip(transactions, results)
+        ]
+
+    def _submit_script_call(self, transaction: TransactionRequest, now: datetime) -> Tuple[list, list]:
+        transaction_id = transaction.id
+        status_fields = self._encode_fields({
             "transactionId": transaction_id,
             "status": TransactionStatus.PENDING.value,
             "submittedAt": now.isoformat(),
-            "completedAt": None,
-            "error": None,
             "retryCount": 0,
-            "transaction_data": transaction.model_dump()
-        }
+            "callbackUrl": str(transaction.callback_url) if transaction.callback_url else None,
+            "callbackBatch": 1 if transaction.callback_url and transaction.callback_batch else None
+        })
+        keys = [
+            f"{self.dedup_key_prefix}{transaction_id}",
+            f"{self.status_key_prefix}{transaction_id}",
+            f"{self.payload_key_prefix}{transaction_id}",
+            self.queue.stream_key
+        ]
+        args = [
+            transaction_id, now.isoformat(), self.dedup_ttl, self.status_ttl,
+            encode_payload(transaction.model_dump(exclude=CLIENT_ONLY_FIELDS), self.codec), *status_fields
+        ]
+        return keys, args
 
-        status_key = f"{self.status_key_prefix}{transaction_id}"
-        self.redis_client.setex(status_key, 86400, json.dumps(status_record, default=str))
+    def _submit_result(self, transaction_id: str, now: datetime, result: list) -> Tuple[Optional[TransactionResponse], bool]:
+        if result[0] == "duplicate":
+            metrics.inc("transactions_duplicate_total")
+            logger.info("Duplicate transaction detected: %s", transaction_id, extra={"transaction_id": transaction_id})
+            existing = result[1] if len(result) > 1 else []
+            return self._parse_status_record(transaction_id, dict(zip(existing[::2], existing[1::2]))), True
 
-        queue_item = {"transaction_id": transaction_id, "queued_at": now.isoformat()}
-        self.redis_client.lpush(self.queue_key, json.dumps(queue_item))
-        logger.info(f"Queued transaction {transaction_id}")
+        metrics.inc("transactions_submitted_total")
+        logger.info("Queued transaction %s", transaction_id, extra={"transaction_id": transaction_id})
 
         return TransactionResponse(
             transactionId=transaction_id,
             status=TransactionStatus.PENDING,
             submittedAt=now
-        )
+        ), False
+
+    async def get_transaction_status(self, transaction_id: str, cached: bool = True) -> Optional[TransactionResponse]:
+        """Pass cached=False to read Redis even when the status cache holds the id, as watchers must"""
+        if cached and self.cache is not None:
+            response = self.cache.get(transaction_id)
+            if response:
+                return response
+
+        status_key = f"{self.status_key_prefix}{transaction_id}"
+        try:
+            values = await self.redis_client.hmget(status_key, RESPONSE_FIELDS)
+        except ResponseError as e:
+            if not _is_wrong_type(e):
+                raise
+            values = await self._upgrade_legacy_status(transaction_id)
+        return self._cache_response(self._parse_status_record(transaction_id, dict(zip(RESPONSE_FIELDS, values))))
+
+    async def get_transaction_statuses(self, transaction_ids: List[str],
+                                       cached: bool = True) -> List[Optional[TransactionResponse]]:
+        """Resolve many statuses in one pipelined round trip; None where not found"""
+        responses = {}
+        if cached and self.cache is not None:
+            for transaction_id in transaction_ids:
+                response = self.cache.get(transaction_id)
+                if response:
+                    responses[transaction_id] = response
 
-    async def get_transaction_status(self, transaction_id: str) -> Optional[TransactionResponse]:
+        missing = [transaction_id for transaction_id in transaction_ids if transaction_id not in responses]
+        if missing:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for transaction_id in missing:
+                    pipe.hmget(f"{self.status_key_prefix}{transaction_id}", RESPONSE_FIELDS)
+                results = await pipe.execute(raise_on_error=False)
+            for transaction_id, values in zip(missing, results):
+                if isinstance(values, ResponseError):
+                    if not _is_wrong_type(values):
+                        raise values
+                    values = await self._upgrade_legacy_status(transaction_id)
+                responses[transaction_id] = self._cache_response(
+                    self._parse_status_record(transaction_id, dict(zip(RESPONSE_FIELDS, values)))
+                )
+
+        return [responses[transaction_id] for transaction_id in transaction_ids]
+
+    async def _upgrade_legacy_status(self, transaction_id: str) -> List[Optional[str]]:
+        """Rewrite a status record still stored as a JSON string by an earlier release, then read it again"""
         status_key = f"{self.status_key_prefix}{transaction_id}"
-        status_data = self.redis_client.get(status_key)
+        await UPGRADE_LEGACY_STATUS(self.redis_client, keys=[status_key, f"{self.payload_key_prefix}{transaction_id}"])
+        return await self.redis_client.hmget(status_key, RESPONSE_FIELDS)
+
+    def _cache_response(self, response: Optional[TransactionResponse]) -> Optional[TransactionResponse]:
+        if self.cache is not None and response:
+            age = (datetime.now(timezone.utc) - response.submittedAt).total_seconds()
+            self.cache.put(response, record_ttl=self.status_ttl - age)
+        return response
 
-        if not status_data:
+    def _parse_status_record(self, transaction_id: str, record: Dict[str, Optional[str]]) -> Optional[TransactionResponse]:
+        if not record or not record.get("status"):
             return None
 
         try:
-            record = json.loads(status_data)
             return TransactionResponse(
                 transactionId=record["transactionId"],
                 status=TransactionStatus(record["status"]),
                 submittedAt=datetime.fromisoformat(record["submittedAt"]),
-                completedAt=datetime.fromisoformat(record["completedAt"]) if record["completedAt"] else None,
+                completedAt=datetime.fromisoformat(record["completedAt"]) if record.get("completedAt") else None,
                 error=record.get("error")
             )
         except Exception as e:
-            logger.error(f"Error parsing status for {transaction_id}: {str(e)}")
+            logger.error("Error parsing status for %s: %s", transaction_id, e, extra={"transaction_id": transaction_id})
             return None
 
-    def update_transaction_status(self, transaction_id: str, status: TransactionStatus,
-                                  error: Optional[str] = None, completed_at: Optional[datetime] = None):
-        status_key = f"{self.status_key_prefix}{transaction_id}"
-        status_data = self.redis_client.get(status_key)
+    async def update_transaction_status(self, transaction_id: str, status: TransactionStatus,
+                                        error: Optional[str] = None, completed_at: Optional[datetime] = None,
+                                        **fields) -> bool:
+        """Apply a status transition in one round trip. Returns False if it was not allowed."""
+        applied = await TRANSITION_STATUS(
+            self.redis_client,
+            keys=[f"{self.status_key_prefix}{transaction_id}", self.webhook_stream_key,
+                  f"{self.payload_key_prefix}{transaction_id}"],
+            args=[self._allowed_from(status), status.value, self._webhooks_flag(),
+                  *self._encode_fields(self.status_fields(error, completed_at, **fields))]
+        )
+        if applied:
+            logger.info("Updated transaction %s status to %s", transaction_id, status.value,
+                        extra={"transaction_id": transaction_id})
+        else:
+            logger.warning("Rejected transition of %s to %s", transaction_id, status.value,
+                           extra={"transaction_id": transaction_id})
+        return bool(applied)
+
+    @staticmethod
+    def status_fields(error: Optional[str] = None, completed_at: Optional[datetime] = None, **fields) -> dict:
+        if error:
+            fields["error"] = error
+        if completed_at:
+            fields["completedAt"] = completed_at.isoformat()
+        return fields
 
-        if status_data:
+    async def claim_records(self, transaction_ids: List[str]) -> List[Optional[dict]]:
+        """
+        Move a batch to processing and fetch its records and payloads in one
+        pipeline. None where the record is missing or no longer claimable
+        (already final); a record whose fields or payload cannot be read
+        carries the reason under "parse_error" instead of "posting_body".
+        """
+        for attempt in range(2):
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for transaction_id in transaction_ids:
+                    status_key = f"{self.status_key_prefix}{transaction_id}"
+                    TRANSITION_STATUS.queue(
+                        pipe,
+                        keys=[status_key, self.webhook_stream_key, f"{self.payload_key_prefix}{transaction_id}"],
+                        args=[self._allowed_from(TransactionStatus.PROCESSING), TransactionStatus.PROCESSING.value,
+                              self._webhooks_flag()]
+                    )
+                    pipe.hgetall(status_key)
+                    pipe.get(f"{self.payload_key_prefix}{transaction_id}")
+                try:
+                    results = await pipe.execute()
+                    break
+                except NoScriptError:
+                    # Script cache was flushed (restart, failover): no transition
+                    # applied, so reload and resend the whole batch
+                    if attempt:
+                        raise
+                    await load_scripts(self.redis_client)
+
+        records = []
+        for transaction_id, claimed, record, payload in zip(transaction_ids, results[::3], results[1::3], results[2::3]):
+            if not claimed:
+                logger.warning("Transaction %s is missing or already final, skipping", transaction_id,
+                               extra={"transaction_id": transaction_id})
+                records.append(None)
+                continue
             try:
-                record = json.loads(status_data)
-                record["status"] = status.value
-                if error:
-                    record["error"] = error
-                if completed_at:
-                    record["completedAt"] = completed_at.isoformat()
-
-                self.redis_client.setex(status_key, 86400, json.dumps(record, default=str))
-                logger.info(f"Updated transaction {transaction_id} status to {status.value}")
-            except Exception as e:
-                logger.error(f"Error updating status for {transaction_id}: {str(e)}")
-
-    def get_queue_depth(self) -> int:
-        return self.redis_client.llen(self.queue_key)
-
-    def get_next_transaction(self) -> Optional[str]:
-        try:
-            result = self.redis_client.brpop(self.queue_key, timeout=1)
-            if result:
-                queue_item = json.loads(result[1])
-                return queue_item["transaction_id"]
-        except Exception as e:
-            logger.error(f"Error getting next transaction: {str(e)}")
-        return None
+                record["retryCount"] = int(record.get("retryCount", 0))
+                record["postAttempts"] = int(record.get("postAttempts", 0))
+                # Validated at submission; the worker posts it as stored
+                record["posting_body"] = payload_posting_body(payload)
+                records.append(record)
+            except (AttributeError, ValueError, zlib.error) as e:
+                # Already moved to processing, so it has to be failed rather than dropped
+                logger.error("Error parsing record for %s: %s", transaction_id, e,
+                             extra={"transaction_id": transaction_id})
+                record["parse_error"] = f"Unreadable transaction record: {e}"
+                records.append(record)
+        return records
+
+    def commit_outcome_in(self, pipe, entry: QueueEntry, status: TransactionStatus,
+                          fields: dict, retry_at: Optional[float] = None):
+        """Queue an atomic transition + retry scheduling + ack on a pipeline owned by the caller"""
+        COMMIT_OUTCOME.queue(
+            pipe,
+            keys=[f"{self.status_key_prefix}{entry.transaction_id}", self.queue.retry_key,
+                  self.queue.stream_key, self.webhook_stream_key, f"{self.payload_key_prefix}{entry.transaction_id}"],
+            args=[
+                self._allowed_from(status), status.value, self.queue.group, entry.entry_id,
+                int(retry_at * 1000) if retry_at is not None else "", entry.transaction_id,
+                self._webhooks_flag(), *self._encode_fields(fields)
+            ]
+        )
+
+    async def get_webhook_deliveries(self, transaction_ids: List[str]) -> List[Tuple[Optional[TransactionResponse], Optional[str], int, bool]]:
+        """
+        Load (response, callback URL, failed delivery attempts, accepts
+        coalesced deliveries) per transaction in one round trip
+        """
+        fields = RESPONSE_FIELDS + ("callbackUrl", "webhookAttempts", "callbackBatch")
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for transaction_id in transaction_ids:
+                pipe.hmget(f"{self.status_key_prefix}{transaction_id}", fields)
+            results = await pipe.execute()
+
+        deliveries = []
+        for transaction_id, values in zip(transaction_ids, results):
+            record = dict(zip(fields, values))
+            deliveries.append((
+                self._parse_status_record(transaction_id, record),
+                record["callbackUrl"],
+                int(record["webhookAttempts"] or 0),
+                bool(record["callbackBatch"])
+            ))
+        return deliveries
+
+    def record_webhook_attempt_in(self, pipe, transaction_id: str):
+        pipe.hincrby(f"{self.status_key_prefix}{transaction_id}", "webhookAttempts", 1)
+
+    @staticmethod
+    def _webhooks_flag() -> str:
+        """Script argument telling final transitions whether to queue webhook deliveries"""
+        return "1" if settings.webhooks_enabled else "0"
+
+    @staticmethod
+    def _allowed_from(status: TransactionStatus) -> str:
+        return ",".join(allowed.value for allowed in ALLOWED_TRANSITIONS[status])
+
+    @staticmethod
+    def _encode_fields(fields: dict) -> list:
+        """Flatten to HSET field/value arguments, dropping unset values"""
+        args = []
+        for field, value in fields.items():
+            if value is not None:
+                args.extend((field, value))
+        return args
+
+    async def get_queue_depth(self) -> int:
+        return await self.queue.depth()
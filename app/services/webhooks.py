@@ -0,0 +1,207 @@
+import json
+import time
+import asyncio
+import logging
+import httpx
+import redis.asyncio as redis
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.models import TransactionResponse
+from app.services.transaction_queue import TransactionQueue, QueueEntry
+from app.services.transaction_service import TransactionService
+from app.utils.callback_urls import public_address
+
+logger = logging.getLogger(__name__)
+
+Delivery = Tuple[QueueEntry, TransactionResponse, int]
+
+class WebhookQueue(TransactionQueue):
+    """Durable outbox of completion webhooks, fed by final status transitions"""
+
+    stream_key = "webhook_stream"
+    retry_key = "webhook_retry"
+
+    def __init__(self, redis_client: redis.Redis, consumer: Optional[str] = None):
+        super().__init__(redis_client, consumer)
+        self.group = settings.webhook_consumer_group
+
+class WebhookDispatcher:
+    """
+    Delivers final TransactionResponses to their callback URLs.
+
+    Runs apart from the posting workers with its own connection pool, so a
+    slow or failing endpoint only ever holds up its own deliveries. Each
+    destination host gets a bounded number of concurrent requests; leased
+    deliveries for a host already at its limit are put back through the
+    retry set rather than held, so they take no slot and no lease. A
+    completion is POSTed on its own unless the transaction opted in with
+    callback_batch, in which case its URL always receives
+    {"transactions": [...]}, coalescing completions for that URL up to
+    webhook_batch_max_size per POST. Failed deliveries are
+    rescheduled through the outbox's retry set, so they survive restarts.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis_client = redis_client
+        self.transaction_service = TransactionService(redis_client)
+        self.queue = WebhookQueue(redis_client, consumer=TransactionQueue.default_consumer_name())
+        self.batch_size = settings.worker_batch_size
+        self.max_in_flight = settings.webhook_max_connections
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.webhook_timeout),
+            limits=httpx.Limits(max_connections=settings.webhook_max_connections)
+        )
+        self.running = False
+        self._host_in_flight: Dict[str, int] = {}  # hosts with deliveries under way only
+        self._in_flight: set = set()
+
+    async def start(self):
+        self.running = True
+        await self.queue.ensure_group()
+        logger.info(f"Starting webhook dispatcher as consumer {self.queue.consumer}")
+
+        retry_task = asyncio.create_task(self._retry_loop())
+        try:
+            await self._dispatch_loop()
+            if self._in_flight:
+                await asyncio.wait(self._in_flight, timeout=settings.worker_shutdown_grace_s)
+        finally:
+            retry_task.cancel()
+            for task in list(self._in_flight):
+                task.cancel()
+
+    def stop(self):
+        self.running = False
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _dispatch_loop(self):
+        while self.running:
+            try:
+                free = self.max_in_flight - len(self._in_flight)
+                if free <= 0:
+                    await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                entries = await self.queue.read(count=min(self.batch_size, free), block_ms=1000)
+                if not entries:
+                    continue
+
+                targets = await self.transaction_service.get_webhook_deliveries(
+                    [entry.transaction_id for entry in entries]
+                )
+                by_url: Dict[Tuple[str, bool], List[Delivery]] = {}
+                expired = []
+                for entry, (response, url, attempts, batch) in zip(entries, targets):
+                    if response and url:
+                        by_url.setdefault((url, batch), []).append((entry, response, attempts))
+                    else:
+                        expired.append(entry.entry_id)
+                if expired:
+                    logger.warning(f"Dropping {len(expired)} webhooks for expired transactions")
+                    await self.queue.ack(*expired)
+
+                deferred: List[Delivery] = []
+                for (url, batch), deliveries in by_url.items():
+                    host = httpx.URL(url).netloc.decode()
+                    chunk_size = max(1, settings.webhook_batch_max_size) if batch else 1
+                    for i in range(0, len(deliveries), chunk_size):
+                        if self._host_in_flight.get(host, 0) >= settings.webhook_max_concurrency_per_host:
+                            deferred.extend(deliveries[i:i + chunk_size])
+                        else:
+                            self._start(host, url, deliveries[i:i + chunk_size], batch)
+                if deferred:
+                    await self._defer(deferred)
+
+            except Exception as e:
+                logger.error(f"Webhook dispatcher error: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _retry_loop(self):
+        interval = settings.retry_poll_interval_ms / 1000
+        while self.running:
+            try:
+                promoted = await self.queue.promote_due_retries(limit=self.batch_size)
+                if promoted < self.batch_size:
+                    await asyncio.sleep(interval)
+            except Exception as e:
+                logger.error(f"Webhook retry scheduler error: {str(e)}")
+                await asyncio.sleep(1)
+
+    def _start(self, host: str, url: str, deliveries: List[Delivery], batch: bool):
+        self._host_in_flight[host] = self._host_in_flight.get(host, 0) + 1
+        task = asyncio.create_task(self._deliver(url, deliveries, batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        task.add_done_callback(lambda _: self._release_host(host))
+
+    def _release_host(self, host: str):
+        if self._host_in_flight[host] > 1:
+            self._host_in_flight[host] -= 1
+        else:
+            del self._host_in_flight[host]
+
+    async def _defer(self, deliveries: List[Delivery]):
+        """Put deliveries for busy hosts back through the retry set, without counting an attempt"""
+        due = int(time.time() * 1000)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.queue.retry_key, {entry.transaction_id: due for entry, _, _ in deliveries})
+            self.queue.ack_in(pipe, *(entry.entry_id for entry, _, _ in deliveries))
+            await pipe.execute()
+
+    async def _deliver(self, url: str, deliveries: List[Delivery], batch: bool = False):
+        if not batch:
+            body = deliveries[0][1].model_dump_json()
+        else:
+            body = json.dumps({"transactions": [response.model_dump(mode="json") for _, response, _ in deliveries]})
+
+        error, retry = None, True
+        try:
+            address = await public_address(url)
+            if address is not None:
+                response = await self.client.send(self._pinned_request(url, address, body))
+                if not response.is_success:
+                    error = f"status {response.status_code}"
+            else:
+                # Never worth retrying: the callback points inside our network
+                error, retry = "callback host resolves to a non-public address", False
+        except (httpx.HTTPError, OSError) as e:
+            error = str(e) or type(e).__name__
+
+        try:
+            await self._settle(url, deliveries, error, retry)
+        except Exception as e:
+            # Unacked entries are redelivered after the visibility timeout
+            logger.error(f"Failed to settle {len(deliveries)} webhooks for {url}: {str(e)}")
+
+    def _pinned_request(self, url: str, address: str, body: str) -> httpx.Request:
+        """
+        POST to the address that was checked instead of looking the name up
+        again, keeping the Host header and the TLS server name (and so the
+        certificate check) on the callback's own host
+        """
+        target = httpx.URL(url)
+        return self.client.build_request(
+            "POST", target.copy_with(host=address), content=body,
+            headers={"Content-Type": "application/json", "Host": target.netloc.decode()},
+            extensions={"sni_hostname": target.host} if target.scheme == "https" else None
+        )
+
+    async def _settle(self, url: str, deliveries: List[Delivery], error: Optional[str], retry: bool = True):
+        """Ack delivered webhooks, or reschedule them with exponential backoff"""
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            for entry, response, attempts in deliveries:
+                if error is not None and retry and attempts + 1 < settings.webhook_max_attempts:
+                    due = time.time() + settings.webhook_retry_delay * (2 ** attempts)
+                    pipe.zadd(self.queue.retry_key, {entry.transaction_id: int(due * 1000)})
+                    self.transaction_service.record_webhook_attempt_in(pipe, entry.transaction_id)
+                elif error is not None:
+                    logger.error(f"Giving up webhook for {entry.transaction_id} to {url} after {attempts + 1} attempts: {error}")
+                self.queue.ack_in(pipe, entry.entry_id)
+            await pipe.execute()
+
+        if error is None:
+            logger.debug("Delivered %d webhooks to %s", len(deliveries), url)
+        else:
+            logger.warning(f"Webhook delivery to {url} failed: {error}")
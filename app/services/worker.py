@@ -1,157 +1,411 @@
 import asyncio
 import logging
 import time
+import redis.asyncio as redis
 from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional, NamedTuple
+from redis.exceptions import NoScriptError
 from app.services.transaction_service import TransactionService
-from app.services.posting_client import PostingServiceClient
-from app.models import TransactionRequest, TransactionStatus
+from app.services.posting_client import PostingServiceClient, PostingJob, PostFailure, AMBIGUOUS_FAILURES
+from app.services.transaction_queue import TransactionQueue, QueueEntry
+from app.services.redis_scripts import load_scripts
+from app.services.flow_control import AdaptiveLimiter, CircuitBreaker
+from app.services.worker_registry import WorkerRegistry
+from app.utils.monitoring import metrics
+from app.utils import timing
+from app.models import TransactionStatus
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+class Outcome(NamedTuple):
+    """Status transition produced by one attempt"""
+    status: TransactionStatus
+    fields: dict
+    retry_at: Optional[float] = None
+
 class TransactionWorker:
-    def __init__(self):
-        self.transaction_service = TransactionService()
-        self.posting_client = PostingServiceClient()
+    """
+    Leases batches from the queue and fans them out across the posting
+    concurrency budget. Final statuses and acks are group-committed so that
+    at high queue depth each Redis round trip covers many transactions.
+    Each delivery makes one posting attempt; failures go to the retry set
+    rather than holding a slot through the backoff.
+
+    Concurrency follows an adaptive limit driven by posting latency and
+    errors, and a circuit breaker stops leasing altogether while the
+    posting service is down.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis_client = redis_client
+        self.transaction_service = TransactionService(redis_client)
+        self.posting_client = PostingServiceClient(redis_client)
+        self.queue = TransactionQueue(redis_client, consumer=TransactionQueue.default_consumer_name())
+        self.limiter = AdaptiveLimiter(
+            initial=settings.worker_concurrency,
+            min_limit=settings.worker_min_concurrency,
+            max_limit=settings.worker_max_concurrency,
+            tolerance=settings.limiter_latency_tolerance,
+            backoff_ratio=settings.limiter_backoff_ratio
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.breaker_failure_threshold,
+            open_seconds=settings.breaker_open_s,
+            max_open_seconds=settings.breaker_max_open_s,
+            probe_timeout=settings.posting_timeout
+        )
+        self.registry = WorkerRegistry(redis_client, settings.worker_heartbeat_interval_s)
+        self.batch_size = settings.worker_batch_size
         self.running = False
-        
+        self._in_flight: set = set()
+        self._commits: Optional[asyncio.Queue] = None
+        self._committed = 0
+        # POST rate limit tokens taken before leasing, one per leased entry
+        self._post_tokens = 0
+        self.throughput = 0.0  # committed outcomes/s over the last heartbeat interval
+
     async def start(self):
         """Start worker pool"""
         self.running = True
-        logger.info(f"Starting {settings.worker_concurrency} workers")
-        
-        tasks = []
-        for i in range(settings.worker_concurrency):
-            task = asyncio.create_task(self._worker_loop(f"worker-{i}"))
-            tasks.append(task)
-        
-        await asyncio.gather(*tasks, return_exceptions=True)
-    
+        self._commits = asyncio.Queue()
+        await self.queue.ensure_group()
+        await self.queue.migrate_legacy_list()
+        logger.info(f"Starting {self.limiter.limit} workers as consumer {self.queue.consumer}")
+
+        commit_task = asyncio.create_task(self._commit_loop())
+        retry_task = asyncio.create_task(self._retry_loop())
+        heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        try:
+            await self._dispatch_loop()
+            await self._drain(settings.worker_shutdown_grace_s)
+        finally:
+            commit_task.cancel()
+            retry_task.cancel()
+            heartbeat_task.cancel()
+            for task in list(self._in_flight):
+                task.cancel()
+            try:
+                await self.registry.remove(self.queue.consumer)
+            except Exception as e:
+                logger.warning(f"Failed to deregister worker: {str(e)}")
+
     def stop(self):
-        """Stop worker pool"""
+        """Stop leasing new work; start() returns once in-flight work has drained"""
         self.running = False
         logger.info("Stopping workers")
-    
-    async def _worker_loop(self, worker_id: str):
-        """Main worker loop"""
-        logger.info(f"{worker_id} started")
-        
+
+    async def _drain(self, timeout: float):
+        """Let in-flight transactions finish and their outcomes commit"""
+        if self._in_flight:
+            logger.info(f"Waiting up to {timeout}s for {len(self._in_flight)} in-flight transactions")
+            await asyncio.wait(self._in_flight, timeout=timeout)
+        try:
+            await asyncio.wait_for(self._commits.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            # Uncommitted entries are redelivered after the visibility timeout
+            logger.warning(f"Shutting down with {self._commits.qsize()} uncommitted outcomes")
+
+    async def aclose(self):
+        """Release the posting service connection pool"""
+        await self.posting_client.aclose()
+
+    def status(self) -> dict:
+        return {
+            "active_workers": len(self._in_flight),
+            "throughput_per_s": round(self.throughput, 2),
+            "concurrency": self.limiter.state(),
+            "circuit": self.breaker.state_info(),
+            "rate_limit": self.posting_client.rate_limit_state()
+        }
+
+    async def _dispatch_loop(self):
+        """Lease up to one batch of free slots per round trip and fan it out"""
         while self.running:
             try:
-                # Get next transaction
-                transaction_id = self.transaction_service.get_next_transaction()
-                if not transaction_id:
-                    await asyncio.sleep(0.1)
+                free = self.limiter.limit - len(self._in_flight)
+                if free <= 0:
+                    await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                allowed = self.breaker.available(free)
+                if allowed <= 0:
+                    # Circuit open (or its probe outstanding) - leave the work queued,
+                    # waking at least once a second to notice stop()
+                    await asyncio.sleep(min(max(self.breaker.retry_in(), 0.1), 1.0))
                     continue
-                
-                await self._process_transaction(worker_id, transaction_id)
-                
+
+                # Wait on the POST rate limit before leasing, never while holding
+                # a lease, and only lease as many entries as there are tokens
+                if self.posting_client.post_bucket is not None:
+                    if self._post_tokens < allowed:
+                        self._post_tokens += await self.posting_client.post_bucket.acquire(allowed - self._post_tokens)
+                    allowed = min(allowed, self._post_tokens)
+
+                # Leased entries stay pending until acked
+                entries = await self.queue.read(count=min(self.batch_size, allowed), block_ms=1000)
+                if not entries:
+                    continue
+                self.breaker.start_probe()
+
+                if settings.stage_timing_enabled:
+                    self._record_queue_wait(entries)
+
+                # One round trip moves the batch to processing and loads its records
+                with timing.stage("claim", "worker"):
+                    records = await self.transaction_service.claim_records(
+                        [entry.transaction_id for entry in entries]
+                    )
+                for entry, record in zip(entries, records):
+                    task = asyncio.create_task(self._handle_entry(entry, record))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
+
             except Exception as e:
-                logger.error(f"{worker_id} error: {str(e)}")
+                logger.error(f"Dispatcher error: {str(e)}")
                 await asyncio.sleep(1)
-    
-    async def _process_transaction(self, worker_id: str, transaction_id: str):
-        """Process a single transaction"""
-        logger.info(f"{worker_id} processing transaction {transaction_id}")
-        
-        # Update status to processing
-        self.transaction_service.update_transaction_status(
-            transaction_id, 
-            TransactionStatus.PROCESSING
-        )
-        
-        # Get transaction data
-        status_record = await self.transaction_service.get_transaction_status(transaction_id)
-        if not status_record:
-            logger.error(f"No status record found for {transaction_id}")
-            return
-        
-        # Get full transaction data from Redis
-        status_key = f"{self.transaction_service.status_key_prefix}{transaction_id}"
-        status_data = self.transaction_service.redis_client.get(status_key)
-        if not status_data:
-            logger.error(f"No transaction data found for {transaction_id}")
-            return
-        
-        import json
-        record = json.loads(status_data)
-        transaction_data = record["transaction_data"]
-        transaction = TransactionRequest(**transaction_data)
-        
-        # Process with retries
-        max_retries = settings.max_retries
-        retry_count = record.get("retryCount", 0)
-        
-        for attempt in range(retry_count, max_retries):
+
+    async def _commit_loop(self):
+        """Commit outcomes and ack their entries, batching whatever queued up meanwhile"""
+        while True:
+            commits = [await self._commits.get()]
+            while len(commits) < self.batch_size and not self._commits.empty():
+                commits.append(self._commits.get_nowait())
+
             try:
-                # First check if transaction already exists (idempotency)
-                exists, existing_data = await self.posting_client.get_transaction(transaction_id)
-                if exists:
-                    logger.info(f"Transaction {transaction_id} already exists in posting service")
-                    self.transaction_service.update_transaction_status(
-                        transaction_id,
-                        TransactionStatus.COMPLETED,
-                        completed_at=datetime.utcnow()
-                    )
-                    return
-                
-                # Try to post transaction
-                success, error = await self.posting_client.post_transaction(transaction)
-                
-                if success:
-                    # Success - mark as completed
-                    self.transaction_service.update_transaction_status(
-                        transaction_id,
-                        TransactionStatus.COMPLETED,
-                        completed_at=datetime.utcnow()
-                    )
-                    logger.info(f"Successfully processed transaction {transaction_id}")
-                    return
-                else:
-                    # POST failed - check if it was post-write failure
-                    await asyncio.sleep(1)  # Brief delay
-                    exists, _ = await self.posting_client.get_transaction(transaction_id)
-                    if exists:
-                        # Post-write failure - transaction was actually saved
-                        logger.info(f"Post-write failure detected for {transaction_id} - transaction exists")
-                        self.transaction_service.update_transaction_status(
-                            transaction_id,
-                            TransactionStatus.COMPLETED,
-                            completed_at=datetime.utcnow()
-                        )
-                        return
-                    else:
-                        # Pre-write failure - retry
-                        logger.warning(f"Pre-write failure for {transaction_id}, attempt {attempt + 1}")
-                        if attempt < max_retries - 1:
-                            # Update retry count
-                            record["retryCount"] = attempt + 1
-                            self.transaction_service.redis_client.setex(
-                                status_key, 
-                                86400, 
-                                json.dumps(record, default=str)
-                            )
-                            await asyncio.sleep(settings.retry_delay * (2 ** attempt))  # Exponential backoff
-                        else:
-                            # Max retries exceeded
-                            self.transaction_service.update_transaction_status(
-                                transaction_id,
-                                TransactionStatus.FAILED,
-                                error=f"Max retries exceeded: {error}",
-                                completed_at=datetime.utcnow()
-                            )
-                            logger.error(f"Transaction {transaction_id} failed after {max_retries} attempts")
-                            return
-                            
+                with timing.stage("commit", "worker"):
+                    try:
+                        await self._commit(commits)
+                    except NoScriptError:
+                        # Script cache was flushed under us - nothing in the batch applied
+                        await load_scripts(self.redis_client)
+                        await self._commit(commits)
+                self._committed += len(commits)
+                self._count_outcomes(commits)
+            except Exception as e:
+                # Unacked entries are reclaimed after the visibility timeout
+                logger.error(f"Failed to commit {len(commits)} transaction outcomes: {str(e)}")
+            for _ in commits:
+                self._commits.task_done()
+
+    @staticmethod
+    def _record_queue_wait(entries: List[QueueEntry]):
+        """Time each entry spent queued (since submission or retry promotion) before it was leased"""
+        now = time.time()
+        for entry in entries:
+            if entry.queued_at:
+                waited = now - datetime.fromisoformat(entry.queued_at).timestamp()
+                timing.record("queue_wait", "worker", max(waited, 0.0))
+
+    @staticmethod
+    def _count_outcomes(commits: List[tuple]):
+        for _, outcome in commits:
+            if outcome is None:
+                continue
+            if outcome.status == TransactionStatus.COMPLETED:
+                metrics.inc("transactions_completed_total")
+            elif outcome.status == TransactionStatus.FAILED:
+                metrics.inc("transactions_failed_total")
+            elif outcome.retry_at is not None:
+                metrics.inc("transaction_retries_total")
+
+    async def _heartbeat_loop(self):
+        committed, measured_at = self._committed, time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now > measured_at:
+                self.throughput = (self._committed - committed) / (now - measured_at)
+            committed, measured_at = self._committed, now
+            try:
+                await self.registry.heartbeat(self.queue.consumer, self.status())
             except Exception as e:
-                error_msg = f"Worker error processing {transaction_id}: {str(e)}"
-                logger.error(error_msg)
-                if attempt >= max_retries - 1:
-                    self.transaction_service.update_transaction_status(
-                        transaction_id,
-                        TransactionStatus.FAILED,
-                        error=error_msg,
-                        completed_at=datetime.utcnow()
+                logger.error(f"Worker heartbeat failed: {str(e)}")
+            await asyncio.sleep(self.registry.interval)
+
+    async def _commit(self, commits: List[tuple]):
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for entry, outcome in commits:
+                if outcome is None:
+                    self.queue.ack_in(pipe, entry.entry_id)
+                else:
+                    # Transition, retry scheduling and ack apply atomically per entry
+                    self.transaction_service.commit_outcome_in(
+                        pipe, entry, outcome.status, outcome.fields, outcome.retry_at
                     )
-                    return
-                await asyncio.sleep(settings.retry_delay)
\ No newline at end of file
+            await pipe.execute()
+
+    async def _retry_loop(self):
+        """Promote due retries back onto the queue; safe to run in every worker process"""
+        interval = settings.retry_poll_interval_ms / 1000
+        while self.running:
+            try:
+                promoted = await self.queue.promote_due_retries(limit=self.batch_size)
+                if promoted:
+                    logger.info(f"Promoted {promoted} due retries")
+                if promoted < self.batch_size:
+                    await asyncio.sleep(interval)
+            except Exception as e:
+                logger.error(f"Retry scheduler error: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _handle_entry(self, entry: QueueEntry, record: Optional[dict]):
+        """Run one attempt for a leased entry and commit its outcome"""
+        outcome = None  # ack only - nothing left to do for this entry
+        try:
+            if record and record.get("parse_error"):
+                outcome = Outcome(TransactionStatus.FAILED, TransactionService.status_fields(
+                    error=record["parse_error"],
+                    completed_at=datetime.utcnow()
+                ))
+            elif record and entry.deliveries > settings.queue_max_deliveries:
+                logger.error("Transaction %s exceeded %d deliveries", entry.transaction_id, settings.queue_max_deliveries,
+                             extra={"transaction_id": entry.transaction_id})
+                outcome = Outcome(TransactionStatus.FAILED, TransactionService.status_fields(
+                    error="Max deliveries exceeded",
+                    completed_at=datetime.utcnow()
+                ))
+            elif record:
+                outcome = await self._process_transaction(entry, record)
+        except Exception as e:
+            # Leave the entry pending - the lease expires and it is reclaimed
+            logger.error("Error processing %s: %s", entry.transaction_id, e, extra={"transaction_id": entry.transaction_id})
+            return
+        self._commits.put_nowait((entry, outcome))
+
+    async def _process_transaction(self, entry: QueueEntry, record: dict) -> Outcome:
+        """Run a single posting attempt and return its outcome"""
+        transaction_id = entry.transaction_id
+        attempt = record.get("retryCount", 0)
+        post_attempts = record.get("postAttempts", 0)
+        failure = PostFailure(record["lastFailure"]) if record.get("lastFailure") else None
+        logger.info("Processing transaction %s, attempt %d", transaction_id, attempt + 1,
+                    extra={"transaction_id": transaction_id})
+
+        job = PostingJob(transaction_id, record["posting_body"])
+
+        try:
+            # Only ask the posting service when an earlier POST may have landed:
+            # its outcome was ambiguous, or a previous lease holder died mid-attempt
+            if failure in AMBIGUOUS_FAILURES or entry.deliveries > 1:
+                if not await self._wait_for_get():
+                    # Throttled for long enough to risk the lease expiring: requeue
+                    # without spending an attempt
+                    return Outcome(TransactionStatus.PROCESSING, {}, retry_at=time.time())
+                exists = await self._observe(
+                    "verify", self.posting_client.transaction_exists(transaction_id, rate_limited=False),
+                    lambda exists: exists is None, feeds_limiter=False
+                )
+                if exists:
+                    logger.info("Transaction %s already exists in posting service", transaction_id,
+                                extra={"transaction_id": transaction_id})
+                    return self._completed(record)
+                if exists is None:
+                    error = "Could not verify whether the previous attempt was posted"
+                    if attempt >= settings.max_retries:
+                        return self._failed(transaction_id, error)
+                    return self._retry(transaction_id, attempt, post_attempts, error, failure)
+                failure = None
+
+            if attempt >= settings.max_retries:
+                return self._failed(transaction_id, record.get("lastError"))
+
+            # Try to post transaction. Rate limit waits stay outside the observed
+            # call so they count as neither posting latency nor limiter signal
+            if self._post_tokens:
+                self._post_tokens -= 1
+            else:
+                await self.posting_client.wait_for_post()
+            result = await self._observe(
+                "post", self.posting_client.post(job, rate_limited=False),
+                lambda result: not result.success and result.failure != PostFailure.REJECTED
+            )
+
+            if result.success:
+                logger.info("Successfully processed transaction %s", transaction_id, extra={"transaction_id": transaction_id})
+                return self._completed(record)
+            error, failure = result.error, result.failure
+            if failure != PostFailure.NOT_SENT:
+                post_attempts += 1
+
+        except Exception as e:
+            error = f"Worker error processing {transaction_id}: {str(e)}"
+            logger.error(error, extra={"transaction_id": transaction_id})
+
+        return self._retry(transaction_id, attempt, post_attempts, error, failure)
+
+    async def _wait_for_get(self) -> bool:
+        """Wait on the GET rate limit for at most half the lease; False when that ran out"""
+        try:
+            await asyncio.wait_for(self.posting_client.wait_for_get(), settings.queue_visibility_timeout_ms / 2000)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _observe(self, stage: str, call: Awaitable, is_failure: Callable[[Any], bool],
+                       feeds_limiter: bool = True) -> Any:
+        """
+        Await a posting service call, feeding its latency and outcome to flow
+        control and metrics. Only POSTs size the concurrency limit: a verify GET
+        is far cheaper, and its latency would drag the no-load baseline down.
+        """
+        in_flight = len(self._in_flight)
+        started = time.monotonic()
+        result = await call
+        elapsed = time.monotonic() - started
+        failed = is_failure(result)
+        timing.record(stage, "worker", elapsed)
+        if feeds_limiter:
+            self.limiter.record(elapsed, failed=failed, in_flight=in_flight)
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+    @staticmethod
+    def _completed(record: dict) -> Outcome:
+        """Completion outcome, carrying the transaction's queued -> posted latency"""
+        fields = TransactionService.status_fields(completed_at=datetime.utcnow())
+        if record.get("submittedAt"):
+            latency = max(time.time() - datetime.fromisoformat(record["submittedAt"]).timestamp(), 0.0)
+            metrics.observe("transaction_end_to_end_seconds", latency)
+            fields["postedLatencyMs"] = int(latency * 1000)
+        return Outcome(TransactionStatus.COMPLETED, fields)
+
+    @staticmethod
+    def _failed(transaction_id: str, last_error: Optional[str]) -> Outcome:
+        logger.error("Transaction %s failed after %d attempts", transaction_id, settings.max_retries,
+                     extra={"transaction_id": transaction_id})
+        return Outcome(TransactionStatus.FAILED, TransactionService.status_fields(
+            error=f"Max retries exceeded: {last_error}",
+            completed_at=datetime.utcnow()
+        ))
+
+    @classmethod
+    def _retry(cls, transaction_id: str, attempt: int, post_attempts: int,
+               error: Optional[str], failure: Optional[PostFailure]) -> Outcome:
+        """
+        Schedule the next attempt with exponential backoff. Ambiguous failures
+        are verified first, so they also wait out the verify delay to give a
+        write that did land time to become visible. Once the last attempt is
+        spent, a failure that certainly did not post fails straight away; an
+        ambiguous one comes back once, only to be verified.
+        """
+        last_attempt = attempt + 1 >= settings.max_retries
+        if last_attempt and failure not in AMBIGUOUS_FAILURES:
+            return cls._failed(transaction_id, error)
+        logger.warning("Attempt %d failed for %s, scheduling %s", attempt + 1, transaction_id,
+                       "verification" if last_attempt else "retry", extra={"transaction_id": transaction_id})
+        if last_attempt:
+            delay = settings.posting_verify_delay_ms / 1000
+        else:
+            delay = settings.retry_delay * (2 ** attempt)
+            if failure in AMBIGUOUS_FAILURES:
+                delay = max(delay, settings.posting_verify_delay_ms / 1000)
+        timing.record("backoff", "worker", delay)
+        return Outcome(
+            TransactionStatus.PROCESSING,
+            {"retryCount": attempt + 1, "postAttempts": post_attempts,
+             "lastError": error, "lastFailure": failure.value if failure else ""},
+            retry_at=time.time() + delay
+        )
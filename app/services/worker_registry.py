@@ -0,0 +1,51 @@
+import json
+import time
+import logging
+import redis.asyncio as redis
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+class WorkerRegistry:
+    """
+    Heartbeats of every worker process, wherever it runs, so the API can
+    report on workers it does not host. Each heartbeat stores the worker's
+    status under a key that expires unless refreshed, and scores the
+    worker in a sorted set by the time it was last seen.
+    """
+
+    workers_key = "worker_heartbeats"
+    status_key_prefix = "worker_status:"
+
+    def __init__(self, redis_client: redis.Redis, interval: float):
+        self.redis_client = redis_client
+        self.interval = interval
+        # Missing a few heartbeats in a row means the worker is gone
+        self.expiry = max(1, int(interval * 3))
+
+    async def heartbeat(self, consumer: str, status: dict):
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(f"{self.status_key_prefix}{consumer}", json.dumps(status), ex=self.expiry)
+            pipe.zadd(self.workers_key, {consumer: time.time()})
+            await pipe.execute()
+
+    async def remove(self, consumer: str):
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.delete(f"{self.status_key_prefix}{consumer}")
+            pipe.zrem(self.workers_key, consumer)
+            await pipe.execute()
+
+    async def statuses(self) -> Dict[str, dict]:
+        """Status of every live worker, keyed by consumer name"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.workers_key, "-inf", time.time() - self.expiry)
+            pipe.zrange(self.workers_key, 0, -1)
+            _, consumers = await pipe.execute()
+        if not consumers:
+            return {}
+
+        values = await self.redis_client.mget([f"{self.status_key_prefix}{consumer}" for consumer in consumers])
+        return {
+            consumer: json.loads(value)
+            for consumer, value in zip(consumers, values) if value
+        }
@@ -0,0 +1,61 @@
+"""
+Checks on client-supplied callback URLs. The webhook dispatcher requests
+them from inside our network, so unless WEBHOOK_ALLOW_PRIVATE_NETWORKS is
+set they must not point at loopback, private, link-local or otherwise
+non-public addresses, and with WEBHOOK_ALLOWED_HOSTS set their host must
+be one of those (or a subdomain of one).
+
+callback_url_problem() checks the URL as submitted; public_address()
+checks where its host resolves at delivery time, which also catches names
+that point inwards, and returns the checked address for the delivery to
+connect to.
+"""
+import asyncio
+import socket
+import ipaddress
+from typing import Optional
+from urllib.parse import urlsplit
+from app.config import settings
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def _host_allowed(host: str) -> bool:
+    return any(host == allowed or host.endswith("." + allowed) for allowed in settings.webhook_allowed_hosts)
+
+def callback_url_problem(url: str) -> Optional[str]:
+    """Why a callback URL is refused, or None when it is acceptable"""
+    host = (urlsplit(url).hostname or "").rstrip(".").lower()
+    if not host:
+        return "callback URL has no host"
+    if settings.webhook_allowed_hosts and not _host_allowed(host):
+        return f"callback host {host} is not allowed"
+    if settings.webhook_allow_private_networks:
+        return None
+    if host == "localhost" or host.endswith(".localhost"):
+        return "callback URL must not point at localhost"
+    try:
+        public = is_public_address(host)
+    except ValueError:
+        return None  # a name; checked again where it resolves at delivery
+    return None if public else f"callback address {host} is not public"
+
+async def public_address(url: str) -> Optional[str]:
+    """
+    The address to deliver a callback to, or None when its host resolves to
+    any non-public address. Connecting to the checked address rather than the
+    name keeps a second lookup from being pointed inwards (DNS rebinding).
+    With private networks allowed the host is returned as is. Raises OSError
+    when the host does not resolve.
+    """
+    host = urlsplit(url).hostname
+    if settings.webhook_allow_private_networks:
+        return host
+    addresses = [
+        address[4][0].split("%")[0]
+        for address in await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    ]
+    return addresses[0] if all(is_public_address(address) for address in addresses) else None
@@ -0,0 +1,64 @@
+"""
+Event-loop health. The API and worker coroutines share one loop per
+process, so anything that blocks it stalls every in-flight request.
+
+LoopMonitor measures how late a periodic sleep wakes up (loop lag) into
+event_loop_lag_seconds. With a block threshold set, a watchdog thread also
+watches for the loop going quiet for longer than that and logs the stack
+the loop thread is stuck in, while it is still stuck there; each such stall
+counts toward event_loop_blocked_total.
+"""
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Optional
+from app.utils.monitoring import MetricsCollector, metrics
+
+logger = logging.getLogger(__name__)
+
+class LoopMonitor:
+    def __init__(self, interval: float, block_threshold: float = 0.0,
+                 collector: Optional[MetricsCollector] = None):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.collector = collector or metrics
+        self.lag = 0.0
+        self._beat = time.monotonic()
+        self._reported_beat: Optional[float] = None
+        self._loop_thread: Optional[int] = None
+        self._stopped = threading.Event()
+
+    async def run(self):
+        self._loop_thread = threading.get_ident()
+        watchdog = None
+        if self.block_threshold > 0:
+            watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            watchdog.start()
+        try:
+            while True:
+                self._beat = time.monotonic()
+                await asyncio.sleep(self.interval)
+                self.lag = max(time.monotonic() - self._beat - self.interval, 0.0)
+                self.collector.observe("event_loop_lag_seconds", self.lag)
+                if self.block_threshold > 0 and self.lag >= self.block_threshold:
+                    self.collector.inc("event_loop_blocked_total")
+                    logger.warning(f"Event loop was blocked for {self.lag * 1000:.0f}ms")
+        finally:
+            self._stopped.set()
+
+    def _watch(self):
+        """Runs on its own thread: catch the loop mid-stall and log what it is running"""
+        while not self._stopped.wait(self.block_threshold / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.block_threshold or self._reported_beat == beat:
+                continue
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(f"Event loop blocked for over {stalled * 1000:.0f}ms in:\n{stack}")
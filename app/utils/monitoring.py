@@ -1,44 +1,298 @@
+import os
+import json
+import math
 import time
+import socket
+import asyncio
 import logging
-from typing import Dict, Any
-from datetime import datetime, timedelta
-from app.services.transaction_service import TransactionService
+import redis.asyncio as redis
+from typing import Dict, Any, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+Labels = Tuple[Tuple[str, str], ...]
+
+# Bucket bounds (seconds) exposed to Prometheus; the histograms themselves are finer
+EXPORT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "http_requests_total": "HTTP requests by route, method and status",
+    "http_request_duration_seconds": "Time to first response byte by route",
+    "transactions_submitted_total": "Transactions accepted for processing",
+    "transactions_duplicate_total": "Submissions rejected as duplicates",
+    "transactions_rejected_total": "Submissions shed by admission control",
+    "transactions_completed_total": "Transactions posted successfully",
+    "transactions_failed_total": "Transactions that failed permanently",
+    "transaction_retries_total": "Posting attempts scheduled for retry",
+    "stage_duration_seconds": "Time per stage of the submit and worker pipelines",
+    "transaction_end_to_end_seconds": "Time from submission to a successful post",
+    "event_loop_lag_seconds": "How late the event loop ran a timer scheduled to wake it",
+    "event_loop_blocked_total": "Event loop stalls longer than the block threshold",
+    "rate_limit_throttled_total": "Posting service calls that waited for a rate limit token",
+    "rate_limit_throttled_seconds_total": "Time posting service calls spent waiting for rate limit tokens",
+}
+
+class Histogram:
+    """
+    Log-bucketed histogram with fixed memory, in the style of HdrHistogram:
+    bucket i holds values up to min_value * (1 + precision) ** i, so any
+    recorded value is known to within `precision` however many are recorded.
+    """
+
+    def __init__(self, min_value: float = 1e-5, max_value: float = 100.0, precision: float = 0.02):
+        self.min_value = min_value
+        self.growth = 1 + precision
+        self._log_growth = math.log(self.growth)
+        # Bucket 0 collects everything below min_value, the last everything above max_value
+        self.buckets = int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 2
+        self.counts = [0] * self.buckets
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = min(self.buckets - 1, 1 + int(math.log(value / self.min_value) / self._log_growth))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def upper_bound(self, index: int) -> float:
+        if index >= self.buckets - 1:
+            return math.inf
+        return self.min_value * self.growth ** index
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.upper_bound(index)
+        return self.upper_bound(self.buckets - 1)
+
+    def cumulative(self, bounds: Tuple[float, ...]) -> List[int]:
+        """Counts at or below each bound, using whole buckets that end there"""
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            while index < self.buckets and self.upper_bound(index) <= bound:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            "counts": {str(i): count for i, count in enumerate(self.counts) if count},
+            "count": self.count,
+            "sum": self.sum
+        }
+
+    def merge(self, snapshot: dict):
+        for index, count in snapshot["counts"].items():
+            self.counts[int(index)] += count
+        self.count += snapshot["count"]
+        self.sum += snapshot["sum"]
+
 class MetricsCollector:
+    """
+    In-process counters and histograms. Recording is a dict lookup and an
+    add, so it is safe on hot paths. Snapshots are plain JSON so processes
+    can share them through Redis and be aggregated on scrape.
+    """
+
     def __init__(self):
         self.start_time = time.time()
-        self.request_count = 0
-        self.error_count = 0
-        self.response_times = []
-        
-    def record_request(self, response_time_ms: float, success: bool):
-        """Record a request metric"""
-        self.request_count += 1
-        if not success:
-            self.error_count += 1
-        self.response_times.append(response_time_ms)
-        
-        # Keep only last 1000 response times
-        if len(self.response_times) > 1000:
-            self.response_times = self.response_times[-1000:]
-    
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        series = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        series = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def uptime(self) -> float:
+        return time.time() - self.start_time
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": {
+                name: [[dict(labels), value] for labels, value in series.items()]
+                for name, series in self.counters.items()
+            },
+            "histograms": {
+                name: [[dict(labels), histogram.snapshot()] for labels, histogram in series.items()]
+                for name, series in self.histograms.items()
+            }
+        }
+
+    @classmethod
+    def merged(cls, snapshots: List[dict]) -> "MetricsCollector":
+        """Sum snapshots from several processes into one collector"""
+        total = cls()
+        for snapshot in snapshots:
+            for name, series in snapshot["counters"].items():
+                for labels, value in series:
+                    total.inc(name, value, **labels)
+            for name, series in snapshot["histograms"].items():
+                for labels, histogram in series:
+                    key = tuple(sorted(labels.items()))
+                    total.histograms.setdefault(name, {}).setdefault(key, Histogram()).merge(histogram)
+        return total
+
+    def error_rate(self) -> float:
+        """Share of HTTP requests answered with a 5xx"""
+        requests = self.counters.get("http_requests_total", {})
+        total = sum(requests.values())
+        errors = sum(value for labels, value in requests.items() if dict(labels).get("status", "").startswith("5"))
+        return errors / total if total else 0.0
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                for bound, count in zip(EXPORT_BUCKETS, histogram.cumulative(EXPORT_BUCKETS)):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
     def get_metrics(self) -> Dict[str, Any]:
-        """Get current metrics"""
-        uptime = time.time() - self.start_time
-        error_rate = (self.error_count / self.request_count * 100) if self.request_count > 0 else 0
-        
-        avg_response_time = sum(self.response_times) / len(self.response_times) if self.response_times else 0
-        
+        """Summary of this process's HTTP metrics"""
+        latency = self.histograms.get("http_request_duration_seconds", {}).values()
+        combined = Histogram()
+        for histogram in latency:
+            combined.merge(histogram.snapshot())
+        uptime = self.uptime()
         return {
             "uptime_seconds": uptime,
-            "total_requests": self.request_count,
-            "total_errors": self.error_count,
-            "error_rate_percent": error_rate,
-            "average_response_time_ms": avg_response_time,
-            "requests_per_second": self.request_count / uptime if uptime > 0 else 0
+            "total_requests": combined.count,
+            "error_rate": self.error_rate(),
+            "p50_response_time_ms": combined.percentile(50) * 1000,
+            "p99_response_time_ms": combined.percentile(99) * 1000,
+            "requests_per_second": combined.count / uptime if uptime > 0 else 0
         }
 
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class MetricsPublisher:
+    """
+    Shares each process's snapshot through Redis so any process can answer
+    a scrape for all of them. Snapshots expire if their process stops
+    publishing, the same way worker heartbeats do.
+    """
+
+    processes_key = "metrics_processes"
+    snapshot_key_prefix = "metrics_snapshot:"
+
+    def __init__(self, redis_client: redis.Redis, collector: MetricsCollector, interval: float):
+        self.redis_client = redis_client
+        self.collector = collector
+        self.interval = interval
+        self.expiry = max(1, int(interval * 3))
+        self.process = f"{socket.gethostname()}-{os.getpid()}"
+
+    async def run(self):
+        while True:
+            try:
+                await self.publish()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Metrics publish failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def publish(self):
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(f"{self.snapshot_key_prefix}{self.process}", json.dumps(self.collector.snapshot()), ex=self.expiry)
+            pipe.zadd(self.processes_key, {self.process: time.time()})
+            await pipe.execute()
+
+    async def collect(self) -> MetricsCollector:
+        """Every live process's metrics merged, with this process's current values"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.processes_key, "-inf", time.time() - self.expiry)
+            pipe.zrange(self.processes_key, 0, -1)
+            _, processes = await pipe.execute()
+
+        others = [process for process in processes if process != self.process]
+        snapshots = [self.collector.snapshot()]
+        if others:
+            values = await self.redis_client.mget([f"{self.snapshot_key_prefix}{process}" for process in others])
+            snapshots.extend(json.loads(value) for value in values if value)
+        return MetricsCollector.merged(snapshots)
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and time to first byte per route template"""
+
+    def __init__(self, app, collector: Optional[MetricsCollector] = None):
+        self.app = app
+        self.collector = collector or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        responded = False
+
+        async def send_wrapper(message):
+            nonlocal responded
+            if message["type"] == "http.response.start":
+                responded = True
+                self._record(scope, str(message["status"]), time.perf_counter() - started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not responded:
+                self._record(scope, "500", time.perf_counter() - started)
+            raise
+
+    def _record(self, scope, status: str, elapsed: float):
+        route = scope.get("route")
+        # Unmatched paths share one label so arbitrary URLs cannot grow the series
+        path = route.path if route is not None else "unmatched"
+        self.collector.inc("http_requests_total", route=path, method=scope["method"], status=status)
+        self.collector.observe("http_request_duration_seconds", elapsed, route=path)
+
 # Global metrics collector
-metrics = MetricsCollector()
\ No newline at end of file
+metrics = MetricsCollector()
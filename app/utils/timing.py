@@ -0,0 +1,130 @@
+"""
+Stage timers for the submit and worker hot paths:
+
+    with stage("redis", "submit"):
+        ...
+
+Each stage feeds stage_duration_seconds{pipeline, stage}. Stages that run
+inside an HTTP request are also listed in its Server-Timing header when
+SERVER_TIMING_ENABLED is set. With STAGE_TIMING_ENABLED=false, stage()
+hands back one shared no-op context manager.
+"""
+import functools
+from time import perf_counter
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from starlette.datastructures import MutableHeaders
+from app.config import settings
+from app.utils.monitoring import metrics
+
+class RequestTimer:
+    """Stages recorded while serving one request"""
+
+    __slots__ = ("started", "pipeline", "handler_done", "spans")
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.pipeline: Optional[str] = None
+        self.handler_done: Optional[float] = None
+        self.spans: List[Tuple[str, float]] = []
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={duration * 1000:.3f}" for name, duration in self.spans)
+
+_request_timer: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+class _Stage:
+    __slots__ = ("name", "pipeline", "started")
+
+    def __init__(self, name: str, pipeline: str):
+        self.name = name
+        self.pipeline = pipeline
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, self.pipeline, perf_counter() - self.started)
+        return False
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NOOP = _NoopStage()
+
+def stage(name: str, pipeline: str):
+    """Time the enclosed block as one stage of a pipeline"""
+    if not settings.stage_timing_enabled:
+        return _NOOP
+    return _Stage(name, pipeline)
+
+def record(name: str, pipeline: str, duration: float):
+    """Record a stage measured some other way (e.g. a scheduled delay)"""
+    if not settings.stage_timing_enabled:
+        return
+    metrics.observe("stage_duration_seconds", duration, pipeline=pipeline, stage=name)
+    timer = _request_timer.get()
+    if timer is not None:
+        timer.spans.append((name, duration))
+
+def start_request() -> Optional[RequestTimer]:
+    """Begin collecting stages for the current request"""
+    if not settings.stage_timing_enabled:
+        return None
+    timer = RequestTimer()
+    _request_timer.set(timer)
+    return timer
+
+def finish_request(timer: Optional[RequestTimer]):
+    """At response start: what ran after the handler returned was response serialization"""
+    if timer is not None and timer.handler_done is not None:
+        record("serialize", timer.pipeline, perf_counter() - timer.handler_done)
+
+def timed_handler(pipeline: str):
+    """
+    Decorate an endpoint so that request parsing and validation (everything
+    before the handler ran) and response serialization are timed as stages.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            timer = _request_timer.get()
+            if timer is None:
+                return await func(*args, **kwargs)
+            timer.pipeline = pipeline
+            record("validate", pipeline, perf_counter() - timer.started)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                timer.handler_done = perf_counter()
+        return wrapper
+    return decorator
+
+class StageTimingMiddleware:
+    """ASGI middleware collecting each request's stages, and listing them in Server-Timing when enabled"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.stage_timing_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        timer = start_request()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                finish_request(timer)
+                if settings.server_timing_enabled and timer.spans:
+                    MutableHeaders(scope=message).append("Server-Timing", timer.server_timing())
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
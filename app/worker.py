@@ -0,0 +1,124 @@
+"""
+Standalone worker entrypoint, so posting throughput scales apart from the API:
+
+    python -m app.worker --processes 4 --concurrency 20
+
+Run the API with EMBEDDED_WORKER=false when workers are deployed this way.
+Each process runs one TransactionWorker (and webhook dispatcher) on its own
+event loop. SIGTERM/SIGINT stop leasing and let in-flight transactions
+finish for up to WORKER_SHUTDOWN_GRACE_S.
+"""
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from typing import List, Optional
+from app.config import settings
+from app.services.redis_pool import create_redis_client, close_redis_client
+from app.services.redis_scripts import load_scripts
+from app.services.worker import TransactionWorker
+from app.services.webhooks import WebhookDispatcher
+from app.utils.monitoring import metrics, MetricsPublisher
+from app.utils.loop_monitor import LoopMonitor
+from app.utils.logging_config import configure_logging
+
+logger = logging.getLogger("app.worker")
+
+async def run_worker():
+    """Run one worker until SIGTERM/SIGINT"""
+    redis_client = create_redis_client()
+    await load_scripts(redis_client)
+
+    worker = TransactionWorker(redis_client)
+    webhooks = WebhookDispatcher(redis_client) if settings.webhooks_enabled else None
+
+    def shutdown():
+        worker.stop()
+        if webhooks:
+            webhooks.stop()
+
+    publisher_task = None
+    if settings.metrics_enabled:
+        publisher = MetricsPublisher(redis_client, metrics, settings.metrics_publish_interval_s)
+        publisher_task = asyncio.create_task(publisher.run())
+
+    loop_monitor_task = None
+    if settings.loop_monitor_enabled:
+        loop_monitor = LoopMonitor(settings.loop_lag_interval_ms / 1000, settings.loop_block_threshold_ms / 1000)
+        loop_monitor_task = asyncio.create_task(loop_monitor.run())
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, shutdown)
+
+    try:
+        await asyncio.gather(worker.start(), *([webhooks.start()] if webhooks else []))
+    finally:
+        if publisher_task:
+            publisher_task.cancel()
+        if loop_monitor_task:
+            loop_monitor_task.cancel()
+        await worker.aclose()
+        if webhooks:
+            await webhooks.aclose()
+        await close_redis_client(redis_client)
+        logger.info("Worker stopped")
+
+def _process_main(concurrency: Optional[int]):
+    configure_logging()
+    if concurrency:
+        settings.worker_concurrency = concurrency
+    asyncio.run(run_worker())
+
+def supervise(processes: int, concurrency: Optional[int]):
+    """Run worker processes, restarting any that die, until signalled"""
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in children:
+            if process.is_alive():
+                process.terminate()
+
+    def spawn() -> multiprocessing.Process:
+        process = multiprocessing.Process(target=_process_main, args=(concurrency,), daemon=False)
+        process.start()
+        return process
+
+    children: List[multiprocessing.Process] = [spawn() for _ in range(processes)]
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    logger.info(f"Started {processes} worker processes")
+
+    while not stopping:
+        for i, process in enumerate(children):
+            if not process.is_alive() and not stopping:
+                logger.error(f"Worker process {process.pid} exited with {process.exitcode}, restarting")
+                children[i] = spawn()
+        time.sleep(1)
+
+    for process in children:
+        process.join(settings.worker_shutdown_grace_s + 5)
+        if process.is_alive():
+            logger.warning(f"Worker process {process.pid} did not stop in time, killing it")
+            process.kill()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run transaction workers outside the API")
+    parser.add_argument("--processes", "-p", type=int, default=settings.worker_processes,
+                        help="worker processes to run (default: WORKER_PROCESSES)")
+    parser.add_argument("--concurrency", "-c", type=int, default=None,
+                        help="initial posting concurrency per process (default: WORKER_CONCURRENCY)")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    if args.processes <= 1:
+        _process_main(args.concurrency)
+    else:
+        supervise(args.processes, args.concurrency)
+
+if __name__ == "__main__":
+    main()
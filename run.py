@@ -1,11 +1,46 @@
+import argparse
+import importlib.util
+import os
 import uvicorn
 from app.config import settings
 
-if __name__ == "__main__":
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the transaction API")
+    parser.add_argument("--profile", choices=("dev", "prod"), default=settings.server_profile,
+                        help="dev: one process with auto-reload; prod: one process per core (default: SERVER_PROFILE)")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers,
+                        help="prod server processes; 0 means one per core (default: SERVER_WORKERS)")
+    args = parser.parse_args()
+
+    if args.profile == "dev":
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level="info"
+        )
+        return
+
+    # Every process binds the same listening socket and runs its own
+    # lifespan, so each owns its Redis pool (and embedded worker, if enabled)
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers or os.cpu_count() or 1,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        backlog=settings.server_backlog,
+        timeout_keep_alive=settings.server_keepalive_s,
+        access_log=settings.server_access_log,
         log_level="info"
-    )
\ No newline at end of file
+    )
+
+if __name__ == "__main__":
+    main()
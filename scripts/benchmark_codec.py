@@ -0,0 +1,49 @@
+"""
+Microbenchmark of the payload record codecs: per-record encode and decode
+time and encoded size, for each codec in app.services.record_codec.
+
+    python scripts/benchmark_codec.py --records 100000
+"""
+import os
+import sys
+import timeit
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.models import TransactionRequest, CLIENT_ONLY_FIELDS
+from app.services.record_codec import CODECS, decode_record, orjson
+
+def sample_payload() -> dict:
+    return TransactionRequest(
+        id="3f1c2a9e-8d4b-4c1e-9a7f-2b6d5e8c0a14",
+        amount=1234.56,
+        currency="USD",
+        description="Benchmark transaction for codec comparison",
+        timestamp=datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc),
+        metadata={"merchant": "acme", "channel": "web", "tags": ["a", "b"]}
+    ).model_dump(exclude=CLIENT_ONLY_FIELDS)
+
+def measure(records: int):
+    payload = sample_payload()
+    print(f"orjson: {'installed' if orjson is not None else 'not installed (stdlib json fallback)'}")
+    print(f"{'codec':<8}{'encode us':>12}{'decode us':>12}{'bytes':>8}")
+    results = {}
+    for name, codec in CODECS.items():
+        encoded = codec.encode(payload)
+        assert decode_record(encoded)["amount"] == payload["amount"]
+        encode = min(timeit.repeat(lambda: codec.encode(payload), number=records, repeat=3)) / records
+        decode = min(timeit.repeat(lambda: decode_record(encoded), number=records, repeat=3)) / records
+        results[name] = (encode, decode)
+        print(f"{name:<8}{encode * 1e6:>12.2f}{decode * 1e6:>12.2f}{len(encoded):>8}")
+
+    baseline, fast = results["json"], results["fast"]
+    print(f"fast saves {(1 - fast[0] / baseline[0]) * 100:.0f}% on encode, "
+          f"{(1 - fast[1] / baseline[1]) * 100:.0f}% on decode")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark payload record codecs")
+    parser.add_argument("--records", type=int, default=100000, help="Records per timing run")
+    args = parser.parse_args()
+    measure(args.records)
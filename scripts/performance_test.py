@@ -2,9 +2,12 @@ import asyncio
 import aiohttp
 import time
 import json
+import os
+import sys
 import uuid
+import subprocess
 import statistics
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 
 BASE_URL = "http://localhost:8000"
 POSTING_SERVICE_URL = "http://localhost:8080"
@@ -15,7 +18,7 @@ async def cleanup_posting_service():
         async with session.post(f"{POSTING_SERVICE_URL}/cleanup") as response:
             print(f"Cleanup response: {response.status}")
 
-async def submit_single_transaction(session, transaction_id):
+async def submit_single_transaction(session, transaction_id, base_url=BASE_URL):
     """Submit a single transaction and measure response time"""
     transaction_data = {
         "id": transaction_id,
@@ -27,7 +30,7 @@ async def submit_single_transaction(session, transaction_id):
     start_time = time.time()
     try:
         async with session.post(
-            f"{BASE_URL}/api/transactions",
+            f"{base_url}/api/transactions",
             json=transaction_data,
             timeout=aiohttp.ClientTimeout(total=5)
         ) as response:
@@ -144,6 +147,83 @@ async def test_status_queries():
         query_time = time.time() - start_time
         print(f"Status query time for {len(transaction_ids)} transactions: {query_time:.2f}s")
 
+async def _submit_load(base_url, num_requests, concurrency):
+    """Submit num_requests with bounded concurrency; returns the number that succeeded"""
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def limited_submit():
+            async with semaphore:
+                return await submit_single_transaction(session, f"scale-test-{uuid.uuid4()}", base_url)
+
+        results = await asyncio.gather(*(limited_submit() for _ in range(num_requests)))
+    return sum(1 for r in results if r["success"])
+
+def _client_process(base_url, num_requests, concurrency):
+    return asyncio.run(_submit_load(base_url, num_requests, concurrency))
+
+def measure_throughput(base_url, num_requests, concurrency, client_processes):
+    """Drive load from several processes so the client is not the bottleneck"""
+    per_client = num_requests // client_processes
+    with ProcessPoolExecutor(client_processes) as pool:
+        start_time = time.time()
+        successes = sum(pool.map(
+            _client_process,
+            [base_url] * client_processes, [per_client] * client_processes, [concurrency] * client_processes
+        ))
+        total_time = time.time() - start_time
+    return successes, successes / total_time
+
+def _wait_for_server(base_url, timeout=30):
+    async def poll():
+        deadline = time.time() + timeout
+        async with aiohttp.ClientSession() as session:
+            while time.time() < deadline:
+                try:
+                    async with session.get(f"{base_url}/api/health") as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.5)
+        raise RuntimeError(f"Server at {base_url} did not become healthy")
+    asyncio.run(poll())
+
+def run_scaling_test(server_workers, num_requests, concurrency, client_processes, port):
+    """
+    Start the API in prod mode with each process count in turn and measure
+    submit throughput. No workers run (EMBEDDED_WORKER=false) so only ingress
+    is measured; admission control is off too, since with nothing draining
+    the queue it would shed submissions once the backlog filled up. The
+    submitted transactions stay queued in Redis afterwards.
+    """
+    base_url = f"http://localhost:{port}"
+    env = dict(os.environ, EMBEDDED_WORKER="false", ADMISSION_ENABLED="false")
+    results = []
+    for workers in server_workers:
+        print(f"\nStarting API with {workers} processes on port {port}")
+        server = subprocess.Popen(
+            [sys.executable, "run.py", "--profile", "prod", "--workers", str(workers), "--port", str(port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_for_server(base_url)
+            measure_throughput(base_url, min(num_requests, 500), concurrency, client_processes)  # warm up
+            successes, throughput = measure_throughput(base_url, num_requests, concurrency, client_processes)
+            print(f"{workers} processes: {successes} ok, {throughput:.0f} req/s")
+            results.append((workers, throughput))
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+    print(f"\n=== Scaling Results ===")
+    print(f"{'processes':>9}  {'req/s':>8}  {'speedup':>7}  {'efficiency':>10}")
+    base = results[0][1] / results[0][0] if results else 0
+    for workers, throughput in results:
+        speedup = throughput / results[0][1]
+        print(f"{workers:>9}  {throughput:>8.0f}  {speedup:>6.2f}x  {throughput / (base * workers) * 100:>9.0f}%")
+
 if __name__ == "__main__":
     import argparse
     
@@ -151,8 +231,20 @@ if __name__ == "__main__":
     parser.add_argument("--requests", type=int, default=1000, help="Number of requests to send")
     parser.add_argument("--concurrency", type=int, default=50, help="Number of concurrent requests")
     parser.add_argument("--test-queries", action="store_true", help="Test status queries")
+    parser.add_argument("--scaling", type=str, default=None,
+                        help="Comma-separated API process counts to compare, e.g. 1,2,4 (starts run.py --profile prod)")
+    parser.add_argument("--client-processes", type=int, default=os.cpu_count() or 1,
+                        help="Load generator processes for --scaling")
+    parser.add_argument("--port", type=int, default=8100, help="Port for servers started by --scaling")
     
     args = parser.parse_args()
+
+    if args.scaling:
+        run_scaling_test(
+            [int(n) for n in args.scaling.split(",")],
+            args.requests, args.concurrency, args.client_processes, args.port
+        )
+        sys.exit(0)
     
     async def main():
         await run_load_test(args.requests, args.concurrency)
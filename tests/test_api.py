@@ -2,15 +2,24 @@ import pytest
 import asyncio
 from fastapi.testclient import TestClient
 from app.main import app
+from app.config import settings
 from app.services.transaction_service import TransactionService
 import json
 import time
+import threading
+import uuid
 
 client = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def app_lifespan():
+    # Run the lifespan so the shared Redis pool exists for every request
+    with client:
+        yield
+
 @pytest.fixture
 def transaction_service():
-    return TransactionService()
+    return TransactionService(app.state.redis)
 
 def test_submit_transaction():
     """Test transaction submission"""
@@ -89,6 +98,153 @@ def test_duplicate_transaction():
     # Both should return same transaction ID
     assert response1.json()["transactionId"] == response2.json()["transactionId"]
 
+def test_duplicate_without_status_record(transaction_service):
+    """Test a duplicate whose status record is gone is reported as a conflict"""
+    transaction_id = f"test-{uuid.uuid4()}"
+    dedup_key = f"{transaction_service.dedup_key_prefix}{transaction_id}"
+    client.portal.call(lambda: app.state.redis.set(dedup_key, "2024-01-01T12:00:00+00:00"))
+    try:
+        response = client.post("/api/transactions", json={
+            "id": transaction_id, "amount": 10.0, "currency": "USD", "description": "Evicted status"
+        })
+    finally:
+        client.portal.call(lambda: app.state.redis.delete(dedup_key))
+
+    assert response.status_code == 409
+
+def test_submit_transaction_batch():
+    """Test batch submission reports duplicates per item"""
+    first_id, second_id = f"batch-test-{uuid.uuid4()}", f"batch-test-{uuid.uuid4()}"
+    transactions = [
+        {"id": first_id, "amount": 10.0, "currency": "USD", "description": "Batch one"},
+        {"id": second_id, "amount": 20.0, "currency": "USD", "description": "Batch two"},
+        {"id": first_id, "amount": 10.0, "currency": "USD", "description": "Batch one again"}
+    ]
+
+    response = client.post("/api/transactions/batch", json=transactions)
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [r["transactionId"] for r in data["results"]] == [first_id, second_id, first_id]
+    assert [r["duplicate"] for r in data["results"]] == [False, False, True]
+    assert data["accepted"] == 2
+    assert data["duplicates"] == 1
+
+    # Resubmitting the whole batch yields only duplicates
+    response = client.post("/api/transactions/batch", json=transactions[:2])
+    assert response.json()["duplicates"] == 2
+
+def test_invalid_transaction_batch():
+    """Test batch validation"""
+    response = client.post("/api/transactions/batch", json=[])
+    assert response.status_code == 422
+
+    response = client.post("/api/transactions/batch", json=[{"amount": -1, "currency": "USD", "description": "x"}])
+    assert response.status_code == 422
+
+    oversized = [{"amount": 1.0, "currency": "USD", "description": "x"}] * (settings.batch_max_size + 1)
+    response = client.post("/api/transactions/batch", json=oversized)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "too_long"
+
+def test_bulk_transaction_status():
+    """Test bulk status lookup reports missing ids inline"""
+    submit_response = client.post("/api/transactions", json={
+        "amount": 12.0,
+        "currency": "USD",
+        "description": "Bulk status test"
+    })
+    transaction_id = submit_response.json()["transactionId"]
+
+    response = client.post("/api/transactions/status", json={"ids": [transaction_id, "non-existent-id"]})
+    assert response.status_code == 200
+
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results[0]["transactionId"] == transaction_id
+    assert results[0]["found"] is True
+    assert results[0]["status"] in ["pending", "processing", "completed", "failed"]
+    assert results[1] == {
+        "transactionId": "non-existent-id", "found": False, "status": None,
+        "submittedAt": None, "completedAt": None, "error": None
+    }
+
+def test_long_poll_transaction_status():
+    """Test long-poll returns a status and validates wait"""
+    submit_response = client.post("/api/transactions", json={
+        "amount": 15.0,
+        "currency": "USD",
+        "description": "Long-poll test"
+    })
+    transaction_id = submit_response.json()["transactionId"]
+
+    response = client.get(f"/api/transactions/{transaction_id}?wait=1s")
+    assert response.status_code == 200
+    assert response.json()["transactionId"] == transaction_id
+
+    response = client.get(f"/api/transactions/{transaction_id}?wait=soon")
+    assert response.status_code == 422
+
+def test_long_poll_holds_through_a_wake_up_without_change(transaction_service):
+    """Test long-poll keeps waiting when woken while the status is unchanged"""
+    transaction_id = f"test-{uuid.uuid4()}"
+    status_key = f"{transaction_service.status_key_prefix}{transaction_id}"
+    # A record no worker will lease, so its status stays put
+    client.portal.call(lambda: app.state.redis.hset(status_key, mapping={
+        "transactionId": transaction_id, "status": "processing", "submittedAt": "2024-01-01T12:00:00+00:00"
+    }))
+    wake = threading.Timer(0.2, client.portal.call, args=(app.state.status_watcher.notify_all,))
+    wake.start()
+    try:
+        started = time.time()
+        response = client.get(f"/api/transactions/{transaction_id}?wait=1s")
+        elapsed = time.time() - started
+    finally:
+        wake.join()
+        client.portal.call(app.state.redis.delete, status_key)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "processing"
+    assert elapsed >= 0.9
+
+def test_watch_unknown_transaction():
+    """Test the SSE watch reports unknown ids and ends the stream"""
+    response = client.get("/api/transactions/watch?ids=non-existent-id")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    event, data = response.text.strip().split("\n")
+    assert event == "event: status"
+    assert json.loads(data.removeprefix("data: "))["found"] is False
+
+def test_submit_transaction_with_callback():
+    """Test callback URLs are accepted and validated"""
+    transaction_data = {
+        "amount": 10.00,
+        "currency": "USD",
+        "description": "Callback transaction",
+        "callback_url": "https://example.com/hooks/transactions"
+    }
+
+    response = client.post("/api/transactions", json=transaction_data)
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+
+    transaction_data["callback_url"] = "not-a-url"
+    response = client.post("/api/transactions", json=transaction_data)
+    assert response.status_code == 422
+
+def test_callback_url_must_be_public():
+    """Test callback URLs pointing inside the network are refused"""
+    for url in ("http://127.0.0.1:8000/hook", "http://169.254.169.254/latest/meta-data",
+                "http://10.0.0.5/hook", "http://[::1]/hook", "http://localhost/hook"):
+        response = client.post("/api/transactions", json={
+            "amount": 10.00,
+            "currency": "USD",
+            "description": "Internal callback",
+            "callback_url": url
+        })
+        assert response.status_code == 422, url
+
 def test_invalid_transaction_data():
     """Test invalid transaction data"""
     # Negative amount
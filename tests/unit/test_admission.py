@@ -0,0 +1,44 @@
+from app.config import settings
+from app.services.redis_pool import create_redis_client
+from app.services.admission import AdmissionController
+
+def make_controller(depth: int) -> AdmissionController:
+    controller = AdmissionController(create_redis_client())
+    controller.max_depth = 100
+    controller.normal_max_depth = 90
+    controller.depth = depth
+    return controller
+
+def test_admits_below_limit():
+    """Test submissions are admitted while the backlog is shallow"""
+    controller = make_controller(depth=10)
+    assert controller.check() is None
+    assert controller.check(count=50) is None
+
+def test_sheds_when_full():
+    """Test a full backlog is rejected with 503 and Retry-After"""
+    controller = make_controller(depth=100)
+    rejection = controller.check()
+    assert rejection.status_code == 503
+    assert rejection.retry_after == settings.admission_retry_after_s
+
+def test_reserved_share_for_priority_clients():
+    """Test only priority clients may use the reserved share"""
+    controller = make_controller(depth=95)
+    assert controller.check().status_code == 429
+    assert controller.check(priority=True) is None
+
+def test_admitted_count_between_refreshes():
+    """Test locally admitted submissions count until the next refresh"""
+    controller = make_controller(depth=80)
+    for _ in range(10):
+        assert controller.check() is None
+    assert controller.check() is not None
+
+def test_sheds_on_drain_time():
+    """Test a backlog that would take too long to drain is rejected"""
+    controller = make_controller(depth=50)
+    controller.drain_rate = 0.01
+    rejection = controller.check()
+    assert rejection.status_code == 503
+    assert 1 <= rejection.retry_after <= settings.admission_max_retry_after_s
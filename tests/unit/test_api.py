@@ -8,9 +8,15 @@ import time
 
 client = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def app_lifespan():
+    # Run the lifespan so the shared Redis pool exists for every request
+    with client:
+        yield
+
 @pytest.fixture
 def transaction_service():
-    return TransactionService()
+    return TransactionService(app.state.redis)
 
 def test_submit_transaction():
     """Test transaction submission"""
@@ -0,0 +1,62 @@
+from app.services.flow_control import AdaptiveLimiter, CircuitBreaker, CircuitState
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_limiter_grows_while_latency_is_healthy():
+    """Test the limit grows additively under healthy latency"""
+    limiter = AdaptiveLimiter(initial=10, min_limit=1, max_limit=20)
+    for _ in range(100):
+        limiter.record(0.01, in_flight=10)
+    assert limiter.limit > 10
+    assert limiter.limit <= 20
+
+def test_limiter_ignores_idle_samples():
+    """Test calls made well under the limit do not raise it"""
+    limiter = AdaptiveLimiter(initial=10, min_limit=1, max_limit=20)
+    for _ in range(100):
+        limiter.record(0.01, in_flight=1)
+    assert limiter.limit == 10
+
+def test_limiter_backs_off_on_latency_and_errors():
+    """Test the limit shrinks multiplicatively on slow or failed calls"""
+    limiter = AdaptiveLimiter(initial=10, min_limit=2, max_limit=20, tolerance=2.0, backoff_ratio=0.5)
+    limiter.record(0.01, in_flight=10)
+    limiter.record(0.05, in_flight=10)
+    assert limiter.limit == 5
+
+    for _ in range(10):
+        limiter.record(0.01, failed=True)
+    assert limiter.limit == 2
+
+def test_breaker_opens_and_probes():
+    """Test the breaker opens on consecutive failures and half-opens for one probe"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=5, max_open_seconds=20, probe_timeout=30, clock=clock)
+    for _ in range(3):
+        assert breaker.available(10) == 10
+        breaker.record_failure()
+
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.available(10) == 0
+
+    clock.now = 5
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.available(10) == 1
+    breaker.start_probe()
+    assert breaker.available(10) == 0
+
+    # A failed probe reopens for twice as long
+    breaker.record_failure()
+    clock.now = 14
+    assert breaker.state == CircuitState.OPEN
+    clock.now = 15
+    assert breaker.available(10) == 1
+    breaker.start_probe()
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.available(10) == 10
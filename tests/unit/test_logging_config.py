@@ -0,0 +1,23 @@
+import logging
+from app.utils.logging_config import TransactionSampler
+
+def make_record(level: int, transaction_id=None) -> logging.LogRecord:
+    record = logging.LogRecord("app", level, __file__, 1, "Queued transaction %s", (transaction_id,), None)
+    if transaction_id is not None:
+        record.transaction_id = transaction_id
+    return record
+
+def test_sampling_is_per_transaction():
+    """Test a transaction's lines are all kept or all dropped, near the configured rate"""
+    sampler = TransactionSampler(0.25)
+    kept = [f"tx-{i}" for i in range(4000) if sampler.filter(make_record(logging.INFO, f"tx-{i}"))]
+    assert 800 <= len(kept) <= 1200
+    assert all(sampler.filter(make_record(logging.DEBUG, transaction_id)) for transaction_id in kept)
+
+def test_warnings_and_untagged_lines_are_kept():
+    """Test sampling never drops warnings, errors or lines without a transaction"""
+    sampler = TransactionSampler(0.0)
+    assert not sampler.filter(make_record(logging.INFO, "tx-1"))
+    assert sampler.filter(make_record(logging.WARNING, "tx-1"))
+    assert sampler.filter(make_record(logging.ERROR, "tx-1"))
+    assert sampler.filter(make_record(logging.INFO))
@@ -0,0 +1,26 @@
+import time
+import asyncio
+import logging
+import pytest
+from app.utils.loop_monitor import LoopMonitor
+from app.utils.monitoring import MetricsCollector
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_measured_and_located(caplog):
+    """Test a blocking call shows up as lag, a blocked count and a stack naming it"""
+    collector = MetricsCollector()
+    monitor = LoopMonitor(interval=0.01, block_threshold=0.05, collector=collector)
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.05)
+
+    with caplog.at_level(logging.WARNING, logger="app.utils.loop_monitor"):
+        block_the_loop(0.2)
+        await asyncio.sleep(0.05)
+    task.cancel()
+
+    assert collector.counters["event_loop_blocked_total"][()] == 1
+    assert collector.histograms["event_loop_lag_seconds"][()].sum >= 0.15
+    assert any("block_the_loop" in record.getMessage() for record in caplog.records)
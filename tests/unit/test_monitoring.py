@@ -0,0 +1,39 @@
+from app.utils.monitoring import Histogram, MetricsCollector
+
+def test_histogram_percentiles_within_precision():
+    """Test percentiles are accurate to the bucket precision"""
+    histogram = Histogram(precision=0.02)
+    for i in range(1, 1001):
+        histogram.observe(i / 1000)
+
+    assert abs(histogram.percentile(50) - 0.5) <= 0.5 * 0.02
+    assert abs(histogram.percentile(99) - 0.99) <= 0.99 * 0.02
+    assert histogram.count == 1000
+
+def test_histogram_memory_is_fixed():
+    """Test recording never grows the histogram"""
+    histogram = Histogram()
+    buckets = len(histogram.counts)
+    for i in range(10000):
+        histogram.observe(i * 0.01)
+    histogram.observe(1e9)
+    histogram.observe(0)
+    assert len(histogram.counts) == buckets
+
+def test_merge_and_render():
+    """Test snapshots from several processes merge into one exposition"""
+    first, second = MetricsCollector(), MetricsCollector()
+    first.inc("http_requests_total", route="/a", method="GET", status="200")
+    second.inc("http_requests_total", route="/a", method="GET", status="500")
+    first.observe("http_request_duration_seconds", 0.002, route="/a")
+    second.observe("http_request_duration_seconds", 0.2, route="/a")
+
+    merged = MetricsCollector.merged([first.snapshot(), second.snapshot()])
+    assert merged.error_rate() == 0.5
+
+    text = merged.render({"transaction_queue_depth": 3})
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_request_duration_seconds_bucket{route="/a",le="0.01"} 1' in text
+    assert 'http_request_duration_seconds_bucket{route="/a",le="+Inf"} 2' in text
+    assert 'http_requests_total{method="GET",route="/a",status="500"} 1' in text
+    assert "transaction_queue_depth 3" in text
@@ -0,0 +1,59 @@
+import pytest
+import httpx
+from app.models import TransactionRequest
+from app.services.posting_client import PostingServiceClient, PostingJob, PostFailure
+
+def make_client(handler) -> PostingServiceClient:
+    client = PostingServiceClient()
+    client.client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    return client
+
+def make_transaction() -> TransactionRequest:
+    return TransactionRequest(
+        amount=10.0,
+        currency="USD",
+        description="Classification test",
+        callback_url="https://example.com/hook"
+    )
+
+def make_job() -> PostingJob:
+    return PostingJob.from_transaction(make_transaction())
+
+@pytest.mark.asyncio
+async def test_post_success():
+    """Test a successful post is one request without client-only fields"""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(201)
+
+    async with make_client(handler) as client:
+        result = await client.post(make_job())
+
+    assert result.success and result.failure is None
+    assert len(requests) == 1
+    assert b"callback_url" not in requests[0].content
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("response_or_error, failure", [
+    (httpx.ConnectError("refused"), PostFailure.NOT_SENT),
+    (httpx.ReadTimeout("slow"), PostFailure.TIMEOUT),
+    (httpx.RemoteProtocolError("closed"), PostFailure.CONNECTION_LOST),
+    (httpx.Response(503), PostFailure.SERVER_ERROR),
+    (httpx.Response(400), PostFailure.REJECTED),
+])
+async def test_post_failure_classification(response_or_error, failure):
+    """Test failures are classified by whether the post may have landed"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if isinstance(response_or_error, Exception):
+            raise response_or_error
+        return response_or_error
+
+    async with make_client(handler) as client:
+        result = await client.post(make_job())
+        success, error = await client.post_transaction(make_transaction())
+
+    assert not result.success
+    assert result.failure == failure
+    assert success is False and error == result.error
@@ -0,0 +1,28 @@
+import time
+import uuid
+import asyncio
+import pytest
+from app.services.redis_pool import create_redis_client, close_redis_client
+from app.services.redis_scripts import load_scripts
+from app.services.rate_limit import TokenBucket
+from app.utils.monitoring import metrics
+
+@pytest.mark.asyncio
+async def test_buckets_share_one_budget():
+    """Test buckets with the same name enforce one rate between them"""
+    client = create_redis_client()
+    try:
+        await load_scripts(client)
+        name = f"test-{uuid.uuid4()}"
+        buckets = [TokenBucket(client, name, rate=50, burst=5) for _ in range(2)]
+
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for bucket in buckets for _ in range(10)))
+        elapsed = time.monotonic() - started
+
+        # 5 tokens of burst, then 15 more at 50/s
+        assert elapsed >= 0.25
+        assert sum(bucket.throttled_calls for bucket in buckets) > 0
+        assert metrics.counters["rate_limit_throttled_seconds_total"][(("bucket", name),)] > 0
+    finally:
+        await close_redis_client(client)
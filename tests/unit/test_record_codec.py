@@ -0,0 +1,49 @@
+import json
+from datetime import datetime, timezone
+from app.services.record_codec import CODECS, decode_record
+from app.services.transaction_service import encode_payload, decode_payload, payload_posting_body
+
+PAYLOAD = {
+    "id": "tx-1",
+    "amount": 10.5,
+    "currency": "USD",
+    "description": "Codec test",
+    "timestamp": datetime(2024, 1, 1, 12, 0, 0, 123456, tzinfo=timezone.utc),
+    "metadata": {"source": "test"}
+}
+
+def test_fast_codec_round_trip():
+    """Test the fast codec keeps timestamps exact, naive or aware"""
+    codec = CODECS["fast"]
+    encoded = codec.encode(PAYLOAD)
+    assert encoded.startswith("f1:")
+    assert decode_record(encoded) == PAYLOAD
+
+    naive = dict(PAYLOAD, timestamp=datetime(2024, 1, 1, 12, 0))
+    assert decode_record(codec.encode(naive)) == naive
+
+def test_reads_every_format():
+    """Test untagged JSON from earlier releases and compressed payloads still decode"""
+    legacy = json.dumps(PAYLOAD, default=str)
+    assert decode_record(legacy)["amount"] == 10.5
+
+    large = dict(PAYLOAD, description="x" * 2000)
+    for codec in CODECS.values():
+        stored = encode_payload(large, codec)
+        assert stored.startswith("z:")
+        assert decode_payload(stored)["description"] == large["description"]
+
+def test_posting_body_from_stored_payload():
+    """Test a stored payload becomes the posting body, untouched when already JSON"""
+    stored = encode_payload(PAYLOAD, CODECS["json"])
+    assert payload_posting_body(stored) is stored
+
+    body = json.loads(payload_posting_body(encode_payload(PAYLOAD, CODECS["fast"])))
+    assert body == json.loads(stored)
+    assert body["timestamp"] == "2024-01-01T12:00:00.123456+00:00"
+
+def test_fast_codec_keeps_large_integers():
+    """Test integers beyond 64 bits fall back to the untagged JSON format and stay exact"""
+    large = dict(PAYLOAD, metadata={"n": 2 ** 70})
+    encoded = CODECS["fast"].encode(large)
+    assert decode_record(encoded)["metadata"]["n"] == 2 ** 70
@@ -0,0 +1,17 @@
+import uuid
+import asyncio
+import pytest
+from app.config import settings
+from app.services.redis_pool import create_redis_client, close_redis_client
+
+@pytest.mark.asyncio
+async def test_full_pool_waits_for_a_connection(monkeypatch):
+    """Test commands beyond max_connections wait for a free connection instead of failing"""
+    monkeypatch.setattr(settings, "redis_max_connections", 5)
+    client = create_redis_client()
+    try:
+        key = f"test-empty-{uuid.uuid4()}"
+        results = await asyncio.gather(*(client.blpop(key, 0.1) for _ in range(10)))
+        assert results == [None] * 10
+    finally:
+        await close_redis_client(client)
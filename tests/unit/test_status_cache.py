@@ -0,0 +1,54 @@
+import time
+from datetime import datetime, timezone
+from app.models import TransactionResponse, TransactionStatus
+from app.services.status_cache import StatusCache
+
+def make_response(transaction_id: str, status: TransactionStatus) -> TransactionResponse:
+    return TransactionResponse(
+        transactionId=transaction_id,
+        status=status,
+        submittedAt=datetime.now(timezone.utc)
+    )
+
+def test_terminal_responses_are_cached():
+    """Test terminal statuses are served from the cache"""
+    cache = StatusCache(max_entries=10, pending_ttl=0.5)
+    response = make_response("t1", TransactionStatus.COMPLETED)
+    cache.put(response, record_ttl=60)
+
+    assert cache.get("t1") is response
+    assert cache.hits == 1
+
+def test_pending_responses_expire_quickly():
+    """Test non-terminal statuses are only held for the pending TTL"""
+    cache = StatusCache(max_entries=10, pending_ttl=0.01)
+    cache.put(make_response("t1", TransactionStatus.PENDING), record_ttl=60)
+
+    time.sleep(0.02)
+    assert cache.get("t1") is None
+
+def test_invalidation():
+    """Test status events and reconnects invalidate entries"""
+    cache = StatusCache(max_entries=10, pending_ttl=60)
+    cache.put(make_response("t1", TransactionStatus.PROCESSING), record_ttl=60)
+    cache.put(make_response("t2", TransactionStatus.PROCESSING), record_ttl=60)
+    cache.put(make_response("t3", TransactionStatus.FAILED), record_ttl=60)
+
+    cache.invalidate("t1")
+    assert cache.get("t1") is None
+
+    cache.invalidate_pending()
+    assert cache.get("t2") is None
+    assert cache.get("t3") is not None
+
+def test_lru_eviction():
+    """Test the cache stays bounded, evicting least recently used"""
+    cache = StatusCache(max_entries=2, pending_ttl=60)
+    cache.put(make_response("t1", TransactionStatus.COMPLETED), record_ttl=60)
+    cache.put(make_response("t2", TransactionStatus.COMPLETED), record_ttl=60)
+    cache.get("t1")
+    cache.put(make_response("t3", TransactionStatus.COMPLETED), record_ttl=60)
+
+    assert len(cache) == 2
+    assert cache.get("t2") is None
+    assert cache.get("t1") is not None
@@ -0,0 +1,27 @@
+from app.config import settings
+from app.utils import timing
+from app.utils.monitoring import metrics
+
+def test_stages_feed_histogram_and_request_timer():
+    """Test a stage is recorded per pipeline and collected for Server-Timing"""
+    timer = timing.start_request()
+    with timing.stage("encode", "submit"):
+        pass
+    timing.record("redis", "submit", 0.0015)
+
+    assert [name for name, _ in timer.spans] == ["encode", "redis"]
+    assert "redis;dur=1.500" in timer.server_timing()
+    assert (("pipeline", "submit"), ("stage", "redis")) in metrics.histograms["stage_duration_seconds"]
+
+def test_disabled_stage_records_nothing(monkeypatch):
+    """Test a disabled stage is the shared no-op and records nothing"""
+    monkeypatch.setattr(settings, "stage_timing_enabled", False)
+    assert timing.stage("encode", "submit") is timing.stage("redis", "submit")
+    assert timing.start_request() is None
+
+    with timing.stage("encode", "disabled"):
+        pass
+    timing.record("redis", "disabled", 0.001)
+
+    series = metrics.histograms.get("stage_duration_seconds", {})
+    assert not any(dict(labels)["pipeline"] == "disabled" for labels in series)
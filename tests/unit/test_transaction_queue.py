@@ -0,0 +1,69 @@
+import json
+import time
+import uuid
+import asyncio
+import pytest
+import pytest_asyncio
+from app.services.redis_pool import create_redis_client, close_redis_client
+from app.services.redis_scripts import load_scripts
+from app.services.transaction_queue import TransactionQueue
+
+@pytest_asyncio.fixture
+async def queue():
+    client = create_redis_client()
+    await load_scripts(client)
+    # Keys of their own so tests never see each other's entries
+    suffix = uuid.uuid4().hex[:8]
+    queue = TransactionQueue(client, consumer="test-consumer")
+    queue.stream_key = f"test_stream:{suffix}"
+    queue.retry_key = f"test_retry:{suffix}"
+    queue.legacy_list_key = f"test_list:{suffix}"
+    queue.group = f"test_group:{suffix}"
+    await queue.ensure_group()
+    yield queue
+    await client.delete(queue.stream_key, queue.retry_key, queue.legacy_list_key, f"{queue.legacy_list_key}:unmigrated")
+    await close_redis_client(client)
+
+@pytest.mark.asyncio
+async def test_legacy_list_items_move_to_stream(queue):
+    """Test items left in the old LIST queue are moved onto the stream, oldest first"""
+    client = queue.redis_client
+    for transaction_id in ("first", "second"):
+        await client.lpush(queue.legacy_list_key, json.dumps({"transaction_id": transaction_id, "queued_at": "2024-01-01T00:00:00"}))
+    await client.lpush(queue.legacy_list_key, "not json")
+
+    assert await queue.migrate_legacy_list(batch_size=2) == 2
+
+    entries = await queue.read(count=10, block_ms=10)
+    assert [entry.transaction_id for entry in entries] == ["first", "second"]
+    assert await client.llen(queue.legacy_list_key) == 0
+    assert await client.lrange(f"{queue.legacy_list_key}:unmigrated", 0, -1) == ["not json"]
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed(queue):
+    """Test an entry leased but never acked is claimed by another consumer once its lease expires"""
+    await queue.redis_client.xadd(queue.stream_key, {"transaction_id": "abandoned"})
+    leased = await queue.read(count=1, block_ms=10)
+    assert leased[0].deliveries == 1
+
+    other = TransactionQueue(queue.redis_client, consumer="other-consumer")
+    other.stream_key, other.group = queue.stream_key, queue.group
+    other.visibility_timeout_ms, other.reclaim_interval = 50, 0
+    assert await other.read(count=1, block_ms=10) == []
+
+    await asyncio.sleep(0.1)
+    reclaimed = await other.read(count=1, block_ms=10)
+    assert [(entry.entry_id, entry.transaction_id) for entry in reclaimed] == [(leased[0].entry_id, "abandoned")]
+    assert reclaimed[0].deliveries == 2
+
+@pytest.mark.asyncio
+async def test_due_retries_are_promoted(queue):
+    """Test only retries whose due time has passed go back onto the stream"""
+    now_ms = int(time.time() * 1000)
+    await queue.redis_client.zadd(queue.retry_key, {"due": now_ms - 1000, "later": now_ms + 60000})
+
+    assert await queue.promote_due_retries() == 1
+
+    entries = await queue.read(count=10, block_ms=10)
+    assert [entry.transaction_id for entry in entries] == ["due"]
+    assert await queue.redis_client.zrange(queue.retry_key, 0, -1) == ["later"]
@@ -0,0 +1,193 @@
+import json
+import time
+import uuid
+import pytest
+import pytest_asyncio
+from redis.exceptions import NoScriptError
+from app.config import settings
+from app.models import TransactionRequest, TransactionStatus
+from app.services.redis_pool import create_redis_client, close_redis_client
+from app.services.redis_scripts import load_scripts
+from app.services.transaction_service import TransactionService, decode_payload
+
+@pytest_asyncio.fixture
+async def service():
+    client = create_redis_client()
+    await load_scripts(client)
+    service = TransactionService(client)
+    # A queue of its own so a worker running elsewhere never leases these entries
+    suffix = uuid.uuid4().hex[:8]
+    service.queue.stream_key = f"test_stream:{suffix}"
+    service.queue.retry_key = f"test_retry:{suffix}"
+    service.queue.group = f"test_group:{suffix}"
+    service.queue.consumer = "test-consumer"
+    await service.queue.ensure_group()
+    yield service
+    await client.delete(service.queue.stream_key, service.queue.retry_key)
+    await close_redis_client(client)
+
+def make_transaction() -> TransactionRequest:
+    return TransactionRequest(id=f"test-{uuid.uuid4()}", amount=10.0, currency="USD", description="Service test")
+
+@pytest.mark.asyncio
+async def test_resubmit_after_dedup_key_expired_is_duplicate(service):
+    """Test an existing status record alone marks a resubmission as a duplicate"""
+    transaction = make_transaction()
+    await service.submit_transaction(transaction)
+    await service.update_transaction_status(transaction.id, TransactionStatus.PROCESSING)
+    await service.update_transaction_status(transaction.id, TransactionStatus.COMPLETED)
+    await service.redis_client.delete(f"{service.dedup_key_prefix}{transaction.id}")
+    depth = await service.queue.depth()
+
+    submitted = await service.submit_transactions([transaction])
+
+    assert submitted[0][1] is True
+    assert submitted[0][0].status == TransactionStatus.COMPLETED
+    assert await service.queue.depth() == depth
+
+@pytest.mark.asyncio
+async def test_legacy_string_record_is_upgraded(service):
+    """Test a JSON string status record from an earlier release is claimed and read as a hash"""
+    transaction = make_transaction()
+    status_key = f"{service.status_key_prefix}{transaction.id}"
+    await service.redis_client.set(status_key, json.dumps({
+        "transactionId": transaction.id,
+        "status": "pending",
+        "submittedAt": "2024-01-01T12:00:00+00:00",
+        "completedAt": None,
+        "error": None,
+        "retryCount": 0,
+        "transaction_data": transaction.model_dump()
+    }, default=str), ex=3600)
+
+    duplicate = await service.submit_transactions([transaction])
+    assert duplicate[0][1] is True
+    assert duplicate[0][0].status == TransactionStatus.PENDING
+
+    record, = await service.claim_records([transaction.id])
+    assert json.loads(record["posting_body"])["amount"] == 10.0
+    assert (await service.get_transaction_status(transaction.id)).status == TransactionStatus.PROCESSING
+    assert 0 < await service.redis_client.ttl(f"{service.payload_key_prefix}{transaction.id}") <= 3600
+
+@pytest.mark.asyncio
+async def test_unreadable_payload_is_reported(service):
+    """Test a claimed record whose payload cannot be decoded carries a failure reason"""
+    transaction = make_transaction()
+    await service.submit_transaction(transaction)
+    await service.redis_client.set(f"{service.payload_key_prefix}{transaction.id}", "z:not-zlib")
+
+    record, = await service.claim_records([transaction.id])
+
+    assert "posting_body" not in record
+    assert record["parse_error"].startswith("Unreadable transaction record")
+
+@pytest.mark.asyncio
+async def test_no_webhook_queued_when_disabled(service, monkeypatch):
+    """Test final transitions only queue webhook deliveries while webhooks are enabled"""
+    monkeypatch.setattr(settings, "webhooks_enabled", False)
+    transaction = make_transaction()
+    transaction.callback_url = "https://example.com/hook"
+    await service.submit_transaction(transaction)
+    depth = await service.redis_client.xlen(service.webhook_stream_key)
+
+    await service.update_transaction_status(transaction.id, TransactionStatus.FAILED, error="Test")
+
+    assert await service.redis_client.xlen(service.webhook_stream_key) == depth
+
+@pytest.mark.asyncio
+async def test_coalesced_webhooks_are_opt_in(service):
+    """Test only transactions submitted with callback_batch accept coalesced webhooks"""
+    single, batched = make_transaction(), make_transaction()
+    single.callback_url = batched.callback_url = "https://example.com/hook"
+    batched.callback_batch = True
+    await service.submit_transactions([single, batched])
+
+    deliveries = await service.get_webhook_deliveries([single.id, batched.id])
+
+    assert [batch for _, _, _, batch in deliveries] == [False, True]
+
+@pytest.mark.asyncio
+async def test_disallowed_transition_is_rejected(service):
+    """Test the compare-and-set refuses transitions the current status does not allow"""
+    transaction = make_transaction()
+    await service.submit_transaction(transaction)
+
+    assert not await service.update_transaction_status(transaction.id, TransactionStatus.COMPLETED)
+    assert (await service.get_transaction_status(transaction.id)).status == TransactionStatus.PENDING
+
+@pytest.mark.asyncio
+async def test_claim_loads_payload_stored_apart(service):
+    """Test the payload lives under its own key and comes back as the posting body on claim"""
+    transaction = make_transaction()
+    await service.submit_transaction(transaction)
+    status_key = f"{service.status_key_prefix}{transaction.id}"
+    assert decode_payload(await service.redis_client.get(f"{service.payload_key_prefix}{transaction.id}"))["amount"] == 10.0
+    assert "transaction_data" not in await service.redis_client.hgetall(status_key)
+
+    record, = await service.claim_records([transaction.id])
+
+    assert record["status"] == TransactionStatus.PROCESSING.value
+    assert record["retryCount"] == 0
+    assert json.loads(record["posting_body"])["id"] == transaction.id
+
+@pytest.mark.asyncio
+async def test_commit_outcome_schedules_retry_and_acks(service):
+    """Test a committed outcome applies its transition, schedules its retry and releases the lease"""
+    transaction = make_transaction()
+    await service.submit_transaction(transaction)
+    entry, = await service.queue.read(count=1, block_ms=10)
+    await service.claim_records([transaction.id])
+
+    async with service.redis_client.pipeline(transaction=False) as pipe:
+        service.commit_outcome_in(pipe, entry, TransactionStatus.PROCESSING, {"retryCount": 1}, retry_at=time.time() + 60)
+        applied, = await pipe.execute()
+
+    assert applied == 1
+    assert await service.redis_client.hget(f"{service.status_key_prefix}{transaction.id}", "retryCount") == "1"
+    assert await service.redis_client.zscore(service.queue.retry_key, transaction.id) is not None
+    assert await service.queue.depth() == 0
+
+@pytest.mark.asyncio
+async def test_commit_outcome_rejected_still_acks(service):
+    """Test an outcome for a record that is already final is not applied or retried, but is acked"""
+    transaction = make_transaction()
+    await service.submit_transaction(transaction)
+    entry, = await service.queue.read(count=1, block_ms=10)
+    await service.update_transaction_status(transaction.id, TransactionStatus.FAILED, error="Cancelled")
+
+    async with service.redis_client.pipeline(transaction=False) as pipe:
+        service.commit_outcome_in(pipe, entry, TransactionStatus.PROCESSING, {"retryCount": 1}, retry_at=time.time())
+        applied, = await pipe.execute()
+
+    assert applied == 0
+    assert (await service.get_transaction_status(transaction.id)).status == TransactionStatus.FAILED
+    assert await service.queue.retry_depth() == 0
+    assert await service.queue.depth() == 0
+
+@pytest.mark.asyncio
+async def test_claim_reloads_flushed_scripts(service, monkeypatch):
+    """Test a claim that hits an empty script cache reloads the scripts and resends"""
+    transaction = make_transaction()
+    await service.submit_transaction(transaction)
+
+    # The NOSCRIPT reply a restarted or failed-over Redis gives for the first pipeline
+    real_pipeline, pipelines = service.redis_client.pipeline, []
+    def pipeline(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+        if not pipelines:
+            async def execute(*args, **kwargs):
+                raise NoScriptError("No matching script. Please use EVAL.")
+            pipe.execute = execute
+        pipelines.append(pipe)
+        return pipe
+    monkeypatch.setattr(service.redis_client, "pipeline", pipeline)
+    loads = []
+    async def load_scripts_spy(client):
+        loads.append(client)
+        await load_scripts(client)
+    monkeypatch.setattr("app.services.transaction_service.load_scripts", load_scripts_spy)
+
+    record, = await service.claim_records([transaction.id])
+
+    assert len(pipelines) == 2 and len(loads) == 1
+    assert record["status"] == TransactionStatus.PROCESSING.value
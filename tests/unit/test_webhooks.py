@@ -0,0 +1,55 @@
+import pytest
+from datetime import datetime
+from app.config import settings
+from app.models import TransactionResponse, TransactionStatus
+from app.services.redis_pool import create_redis_client
+from app.services.transaction_queue import QueueEntry
+from app.services.webhooks import WebhookDispatcher
+
+def make_response(transaction_id: str) -> TransactionResponse:
+    return TransactionResponse(transactionId=transaction_id, status=TransactionStatus.COMPLETED,
+                               submittedAt=datetime(2024, 1, 1, 12))
+
+@pytest.mark.asyncio
+async def test_deliveries_for_a_busy_host_are_deferred():
+    """Test a host at its concurrency limit gets no new delivery task or slot; its entries go back for later"""
+    dispatcher = WebhookDispatcher(create_redis_client())
+    busy, idle = "https://busy.example.com/hook", "https://idle.example.com/hook"
+    entries = [QueueEntry(f"0-{i}", f"tx-{i}") for i in range(3)]
+    targets = [(make_response(entry.transaction_id), url, 0, False)
+               for entry, url in zip(entries, (busy, busy, idle))]
+    dispatcher._host_in_flight["busy.example.com"] = settings.webhook_max_concurrency_per_host
+    started, deferred = [], []
+
+    async def read(count, block_ms):
+        dispatcher.running = False
+        return entries
+
+    async def get_webhook_deliveries(transaction_ids):
+        return targets
+
+    async def defer(deliveries):
+        deferred.extend(entry.transaction_id for entry, _, _ in deliveries)
+
+    dispatcher.queue.read = read
+    dispatcher.transaction_service.get_webhook_deliveries = get_webhook_deliveries
+    dispatcher._defer = defer
+    dispatcher._start = lambda host, url, deliveries, batch: started.append(url)
+    dispatcher.running = True
+    await dispatcher._dispatch_loop()
+
+    assert started == [idle]
+    assert deferred == ["tx-0", "tx-1"]
+    await dispatcher.aclose()
+
+@pytest.mark.asyncio
+async def test_delivery_connects_to_the_checked_address():
+    """Test the callback is requested at the resolved address under its own host name"""
+    dispatcher = WebhookDispatcher(create_redis_client())
+
+    request = dispatcher._pinned_request("https://hooks.example.com:8443/done?x=1", "93.184.216.34", "{}")
+
+    assert str(request.url) == "https://93.184.216.34:8443/done?x=1"
+    assert request.headers["Host"] == "hooks.example.com:8443"
+    assert request.extensions["sni_hostname"] == "hooks.example.com"
+    await dispatcher.aclose()
@@ -0,0 +1,114 @@
+import pytest
+from app.config import settings
+from app.models import TransactionStatus
+from app.services.posting_client import PostFailure, PostResult, AMBIGUOUS_FAILURES
+from app.services.redis_pool import create_redis_client
+from app.services.transaction_queue import QueueEntry
+from app.services.worker import TransactionWorker
+
+def test_retry_backs_off_exponentially():
+    """Test each attempt before the last schedules a retry with a doubling delay"""
+    first = TransactionWorker._retry("tx-1", 0, 1, "HTTP 422", PostFailure.REJECTED)
+    second = TransactionWorker._retry("tx-1", 1, 2, "HTTP 422", PostFailure.REJECTED)
+    assert first.status == second.status == TransactionStatus.PROCESSING
+    assert first.fields["retryCount"] == 1
+    assert second.retry_at - first.retry_at >= settings.retry_delay * 0.9
+
+def test_last_attempt_fails_without_another_retry():
+    """Test the last attempt fails straight away unless it may have posted"""
+    last = settings.max_retries - 1
+    for failure in (PostFailure.REJECTED, PostFailure.NOT_SENT, None):
+        outcome = TransactionWorker._retry("tx-1", last, last, "HTTP 422", failure)
+        assert outcome.status == TransactionStatus.FAILED
+        assert outcome.retry_at is None
+
+    outcome = TransactionWorker._retry("tx-1", last, last, "Timed out", PostFailure.TIMEOUT)
+    assert outcome.status == TransactionStatus.PROCESSING
+
+class CountingPostingClient:
+    """Posting client stand-in counting calls; the transaction already exists upstream"""
+    post_bucket = None
+
+    def __init__(self):
+        self.gets = self.posts = 0
+
+    async def wait_for_get(self):
+        pass
+
+    async def wait_for_post(self):
+        pass
+
+    async def transaction_exists(self, transaction_id, rate_limited=True):
+        self.gets += 1
+        return True
+
+    async def post(self, job, rate_limited=True):
+        self.posts += 1
+        return PostResult(True)
+
+def make_record(**fields) -> dict:
+    return {"retryCount": 0, "postAttempts": 0, "posting_body": "{}",
+            "submittedAt": "2024-01-01T12:00:00+00:00", **fields}
+
+@pytest.mark.asyncio
+async def test_first_attempt_posts_once_without_verifying():
+    """Test a first attempt makes exactly one POST and no GET"""
+    worker = TransactionWorker(create_redis_client())
+    worker.posting_client = CountingPostingClient()
+
+    outcome = await worker._process_transaction(QueueEntry("0-1", "tx-1"), make_record())
+
+    assert outcome.status == TransactionStatus.COMPLETED
+    assert (worker.posting_client.gets, worker.posting_client.posts) == (0, 1)
+
+@pytest.mark.asyncio
+async def test_ambiguous_failure_is_verified_once():
+    """Test every ambiguous last failure triggers exactly one GET, and no POST when the transaction landed"""
+    for failure in AMBIGUOUS_FAILURES:
+        worker = TransactionWorker(create_redis_client())
+        worker.posting_client = CountingPostingClient()
+        record = make_record(retryCount=1, postAttempts=1, lastFailure=failure.value)
+
+        outcome = await worker._process_transaction(QueueEntry("0-1", "tx-1"), record)
+
+        assert outcome.status == TransactionStatus.COMPLETED
+        assert (worker.posting_client.gets, worker.posting_client.posts) == (1, 0)
+
+@pytest.mark.asyncio
+async def test_entries_are_leased_only_for_tokens_held():
+    """Test the dispatcher takes POST rate limit tokens before leasing and leases no more than it holds"""
+    class Bucket:
+        async def acquire(self, wanted=1):
+            return min(wanted, 3)
+
+    class PostingClient:
+        post_bucket = Bucket()
+
+    worker = TransactionWorker(create_redis_client())
+    worker.posting_client = PostingClient()
+    leased = []
+
+    async def read(count, block_ms):
+        leased.append(count)
+        worker.running = False
+        return []
+
+    worker.queue.read = read
+    worker.running = True
+    await worker._dispatch_loop()
+
+    assert leased == [min(worker.batch_size, 3)]
+    assert worker._post_tokens == 3
+
+@pytest.mark.asyncio
+async def test_verify_latency_does_not_size_the_limit():
+    """Test only POST latencies reach the concurrency limiter"""
+    async def call(result):
+        return result
+
+    worker = TransactionWorker(create_redis_client())
+    await worker._observe("verify", call(True), lambda exists: exists is None, feeds_limiter=False)
+    assert worker.limiter.no_load_latency is None
+
+    await worker._observe("post", call(True), lambda result: False)
+    assert worker.limiter.no_load_latency is not None